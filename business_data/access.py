@@ -0,0 +1,96 @@
+"""
+Business Access Cache
+Resolves (user, business slug) to the business and the user's right to use it
+without touching the database on repeat requests. Entries live for a short
+TTL and are dropped early by bumping a per-slug version whenever the Business
+or one of its BusinessMember rows changes. Each entry records the version it
+was cached under, so the version and the entry are read in one round trip.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404
+from rest_framework.exceptions import PermissionDenied
+
+from users.models import Business, BusinessMember
+from .cache import bump_version, get_version, lookup_stats, record_lookup
+
+ACCESS_STATS = 'business-access-cache'
+BUSINESS_FIELDS = ('id', 'owner_id', 'name', 'slug', 'industry', 'location')
+
+
+def _version_key(slug):
+    return f'business-access:{slug}:version'
+
+
+def invalidate_business_access(slug):
+    """Forget every cached access decision for the business"""
+    bump_version(_version_key(slug))
+
+
+def invalidate_on_commit(slug):
+    """Invalidate once the surrounding transaction commits, so readers can't cache old rows"""
+    transaction.on_commit(partial(invalidate_business_access, slug))
+
+
+def _load_access(user, slug):
+    row = Business.objects.filter(slug=slug).values_list(*BUSINESS_FIELDS).first()
+    if row is None:
+        return None
+
+    business = dict(zip(BUSINESS_FIELDS, row))
+    allowed = business['owner_id'] == user.id or BusinessMember.objects.filter(
+        business_id=business['id'], user_id=user.id
+    ).exists()
+    return {'business': row, 'allowed': allowed}
+
+
+def get_business_for_user(user, slug):
+    """Return the Business for slug, raising 404/403 like the uncached lookup"""
+    version_key = _version_key(slug)
+    key = f'business-access:{slug}:{user.id}'
+    cached = cache.get_many([version_key, key])
+    version = cached.get(version_key)
+    if version is None:
+        version = get_version(version_key)
+
+    entry = cached.get(key)
+    if entry is not None and entry['version'] != version:
+        entry = None
+    record_lookup(ACCESS_STATS, hit=entry is not None)
+
+    if entry is None:
+        entry = _load_access(user, slug)
+        if entry is None:
+            raise Http404('No Business matches the given query.')
+        entry['version'] = version
+        cache.set(key, entry, timeout=getattr(settings, 'BUSINESS_ACCESS_CACHE_TIMEOUT', 60))
+
+    if not entry['allowed']:
+        raise PermissionDenied('You do not have access to this business.')
+
+    return Business.from_db(Business.objects.db, BUSINESS_FIELDS, entry['business'])
+
+
+def get_businesses_for_user(user, slugs):
+    """
+    Resolve many slugs in one query. Returns (businesses, missing) where
+    missing lists slugs that do not exist or the user may not use; the two
+    are not told apart.
+    """
+    businesses = list(
+        Business.objects.filter(slug__in=slugs)
+        .filter(Q(owner_id=user.id) | Q(members__user_id=user.id))
+        .distinct()
+        .only(*BUSINESS_FIELDS)
+        .order_by('id')
+    )
+    found = {business.slug for business in businesses}
+    return businesses, [slug for slug in slugs if slug not in found]
+
+
+def access_cache_stats():
+    return lookup_stats(ACCESS_STATS)
@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import Campaign, Product, RawProductRecord, RawSalesRecord, SalesRecord
+from .models import (
+    Campaign,
+    ImportJob,
+    Product,
+    RawProductRecord,
+    RawSalesRecord,
+    SalesRecord,
+)
 
 
 @admin.register(Product)
@@ -32,4 +39,10 @@ class RawSalesRecordAdmin(admin.ModelAdmin):
 class CampaignAdmin(admin.ModelAdmin):
     list_display = ('business', 'goal', 'budget', 'created_at')
     list_filter = ('business', 'created_at')
-    search_fields = ('goal', 'business__name')
\ No newline at end of file
+    search_fields = ('goal', 'business__name')
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('business', 'kind', 'status', 'rows_processed', 'rows_failed', 'created_at')
+    list_filter = ('kind', 'status', 'business')
\ No newline at end of file
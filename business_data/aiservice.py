@@ -1,86 +1,236 @@
 """
 AI Campaign Generation Service
-This is a placeholder - you can integrate with OpenAI, Claude, or other AI services
+Builds a campaign brief from business data and has the configured LLM
+provider (see llm.py) write the summary. Sections that only depend on the
+two analyses are built concurrently on a shared thread pool, each with its
+own timeout and a fallback value when it fails or runs out of time. The
+summary's LLM call is handed what is left of its timeout, so it gives its
+pool thread back instead of running on after the section was abandoned.
 """
 import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from .models import Product, SalesRecord
+from functools import partial
+
+from django.conf import settings
+
+from .analytics import product_analysis, sales_analysis
+from .llm import get_provider
+
+# Key order of Campaign.payload
+CAMPAIGN_SECTIONS = (
+    'summary',
+    'social_posts',
+    'ad_copy',
+    'campaign_calendar',
+    'insights',
+    'product_analysis',
+    'sales_analysis',
+)
+
+logger = logging.getLogger(__name__)
+
+_section_executor = None
+
+
+def get_section_executor():
+    """Lazily create the process-wide pool that builds campaign sections"""
+    global _section_executor
+    if _section_executor is None:
+        _section_executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CAMPAIGN_SECTION_WORKERS', 16),
+            thread_name_prefix='campaign-section',
+        )
+    return _section_executor
+
+
+def uses_parallel_sections():
+    return getattr(settings, 'CAMPAIGN_SECTION_MODE', 'parallel') == 'parallel'
+
+
+def get_section_timeout(name):
+    timeouts = getattr(settings, 'CAMPAIGN_SECTION_TIMEOUTS', {})
+    return timeouts.get(name, getattr(settings, 'CAMPAIGN_SECTION_TIMEOUT', 30))
+
+
+class SectionFanOut:
+    """
+    Independent sections submitted to the section pool together. Each one is
+    given up on once its own timeout has passed; a section still running then
+    is left to finish in the background and its result discarded.
+    """
+
+    def __init__(self, builders):
+        started = time.monotonic()
+        executor = get_section_executor()
+        self.pending = {executor.submit(build): name for name, build in builders.items()}
+        self.deadlines = {
+            future: started + get_section_timeout(name) for future, name in self.pending.items()
+        }
+
+    def ready(self):
+        """Yield (name, future) for sections that have finished, without waiting"""
+        for future in [future for future in self.pending if future.done()]:
+            yield self.pending.pop(future), future
+
+    def gather(self):
+        """
+        Yield (name, future) as sections finish, and (name, None) for each
+        section whose deadline passes first
+        """
+        while self.pending:
+            timeout = min(self.deadlines[future] for future in self.pending) - time.monotonic()
+            wait(self.pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+            yield from self.ready()
+
+            now = time.monotonic()
+            for future in [future for future in self.pending if self.deadlines[future] <= now]:
+                future.cancel()
+                yield self.pending.pop(future), None
+
+    def cancel(self):
+        for future in self.pending:
+            future.cancel()
 
 
 class CampaignGenerator:
     """Generate marketing campaigns based on business data"""
 
-    def __init__(self, business):
+    def __init__(self, business, provider=None, analysis=None):
         self.business = business
+        self.provider = provider or get_provider()
+        # Precomputed {'products': ..., 'sales': ...} from a batch analysis pass
+        self.analysis = analysis or {}
+        # Sections that fell back in the last generated campaign
+        self.incomplete_sections = []
 
     def analyze_products(self):
         """Analyze product data"""
-        products = Product.objects.filter(business=self.business)
-
-        if not products.exists():
-            return {
-                'total_products': 0,
-                'categories': [],
-                'price_range': {'min': 0, 'max': 0},
-                'top_products': [],
-            }
-
-        analysis = {
-            'total_products': products.count(),
-            'categories': list(
-                products.exclude(category='').values_list('category', flat=True).distinct()
-            ),
-            'price_range': {
-                'min': products.order_by('price').first().price,
-                'max': products.order_by('-price').first().price,
-            },
-            'top_products': list(
-                products.order_by('-price')[:5].values('name', 'price', 'category')
-            )
-        }
-
-        return analysis
+        if 'products' in self.analysis:
+            return self.analysis['products']
+        return product_analysis(self.business)
 
     def analyze_sales(self):
         """Analyze sales data"""
-        sales = SalesRecord.objects.filter(business=self.business)
-
-        if not sales.exists():
-            return {'total_sales': 0, 'total_revenue': 0, 'trends': []}
-
-        total_revenue = sum(sale.revenue for sale in sales)
-        total_quantity = sum(sale.quantity for sale in sales)
-
-        # Get top selling products
-        top_products = {}
-        for sale in sales:
-            product_name = sale.product.name
-            if product_name not in top_products:
-                top_products[product_name] = {'quantity': 0, 'revenue': 0}
-            top_products[product_name]['quantity'] += sale.quantity
-            top_products[product_name]['revenue'] += sale.revenue
-
-        top_selling = sorted(
-            top_products.items(),
-            key=lambda x: x[1]['quantity'],
-            reverse=True
-        )[:5]
-
-        return {
-            'total_sales': total_quantity,
-            'total_revenue': total_revenue,
-            'top_selling': [
-                {'product': name, **stats} for name, stats in top_selling
-            ]
-        }
+        if 'sales' in self.analysis:
+            return self.analysis['sales']
+        return sales_analysis(self.business)
 
     def generate_campaign(self, goal='Increase sales', budget=50000):
         """Generate a marketing campaign based on business data"""
+        sections = {
+            name: value
+            for event, name, value in self.iter_campaign(goal=goal, budget=budget)
+            if event == 'section'
+        }
+        return self.build_payload(sections)
+
+    def build_payload(self, sections):
+        """Campaign.payload from the sections yielded by iter_campaign"""
+        payload = {name: sections[name] for name in CAMPAIGN_SECTIONS}
+        if self.incomplete_sections:
+            payload['incomplete_sections'] = [
+                name for name in CAMPAIGN_SECTIONS if name in self.incomplete_sections
+            ]
+        return payload
+
+    def iter_campaign(self, goal='Increase sales', budget=50000, stream=False):
+        """
+        Yield ('section', name, value) for each part of the campaign as soon as
+        it is ready. The templated sections come first; the LLM-written summary
+        comes last, preceded by ('token', 'summary', text) events when stream
+        is True.
+        """
+        self.incomplete_sections = []
         product_analysis = self.analyze_products()
+        yield 'section', 'product_analysis', product_analysis
         sales_analysis = self.analyze_sales()
+        yield 'section', 'sales_analysis', sales_analysis
+
+        brief = self._campaign_brief(goal, budget, product_analysis, sales_analysis)
+        builders = {
+            'social_posts': partial(
+                self._generate_social_posts, product_analysis, sales_analysis, goal
+            ),
+            'ad_copy': partial(self._generate_ad_copy, product_analysis, sales_analysis, budget),
+            'campaign_calendar': self._generate_calendar,
+            'insights': partial(self._generate_insights, product_analysis, sales_analysis),
+        }
+        if not stream:
+            builders['summary'] = partial(
+                self._complete_by, brief, time.monotonic() + get_section_timeout('summary')
+            )
 
-        # Generate campaign summary
-        summary = f"""
+        if uses_parallel_sections():
+            yield from self._parallel_sections(builders, brief, stream)
+            return
+
+        for name, build in builders.items():
+            yield 'section', name, build()
+        if stream:
+            tokens = []
+            for token in self.provider.stream(brief):
+                tokens.append(token)
+                yield 'token', 'summary', token
+            yield 'section', 'summary', ''.join(tokens)
+
+    def _parallel_sections(self, builders, brief, stream):
+        """
+        Fan the builders out and yield each section as it finishes. A streamed
+        summary is read on this thread, with finished sections slotted in
+        between its tokens.
+        """
+        fallbacks = {name: [] for name in builders}
+        # The brief is a readable, if plain, summary of its own
+        fallbacks['summary'] = brief
+
+        def section(name, future):
+            if future is None:
+                return self._fallback(name, fallbacks, 'timed out')
+            try:
+                return future.result()
+            except Exception as exc:
+                return self._fallback(name, fallbacks, exc)
+
+        fan_out = SectionFanOut(builders)
+        try:
+            if stream:
+                tokens = []
+                try:
+                    for token in self.provider.stream(brief):
+                        tokens.append(token)
+                        yield 'token', 'summary', token
+                        for name, future in fan_out.ready():
+                            yield 'section', name, section(name, future)
+                except Exception as exc:
+                    # Keep whatever text already reached the client
+                    fallbacks['summary'] = ''.join(tokens) or brief
+                    summary = self._fallback('summary', fallbacks, exc)
+                else:
+                    summary = ''.join(tokens)
+                yield 'section', 'summary', summary
+
+            for name, future in fan_out.gather():
+                yield 'section', name, section(name, future)
+        finally:
+            fan_out.cancel()
+
+    def _complete_by(self, brief, deadline):
+        """Write the summary, giving the provider only the time left until deadline"""
+        return self.provider.complete(brief, timeout=deadline - time.monotonic())
+
+    def _fallback(self, name, fallbacks, reason):
+        logger.warning(
+            'Campaign section %s for %s fell back: %s', name, self.business.slug, reason
+        )
+        self.incomplete_sections.append(name)
+        return fallbacks[name]
+
+    def _campaign_brief(self, goal, budget, product_analysis, sales_analysis):
+        """The prompt the LLM turns into the campaign summary"""
+        return f"""
 Campaign Goal: {goal}
 Budget: KSh {budget:,.2f}
 
@@ -101,28 +251,6 @@ Recommended Actions:
 4. Leverage WhatsApp for customer engagement
 """
 
-        # Generate social media posts
-        social_posts = self._generate_social_posts(product_analysis, sales_analysis, goal)
-
-        # Generate ad copy
-        ad_copy = self._generate_ad_copy(product_analysis, sales_analysis, budget)
-
-        # Generate campaign calendar
-        calendar = self._generate_calendar()
-
-        # Generate insights
-        insights = self._generate_insights(product_analysis, sales_analysis)
-
-        return {
-            'summary': summary,
-            'social_posts': social_posts,
-            'ad_copy': ad_copy,
-            'campaign_calendar': calendar,
-            'insights': insights,
-            'product_analysis': product_analysis,
-            'sales_analysis': sales_analysis,
-        }
-
     def _format_top_products(self, top_selling):
         """Format top selling products for display"""
         if not top_selling:
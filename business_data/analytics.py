@@ -0,0 +1,189 @@
+"""
+Business Analytics
+Compact, cacheable summaries of a business's catalog and sales. The batch
+variants compute the same summaries for many businesses with a fixed number
+of grouped queries.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db.models import Count, F, Max, Min, Sum, Window
+from django.db.models.functions import RowNumber
+
+from .cache import cached_analyses, cached_analysis
+from .models import DailyProductSales, Product
+
+
+@dataclass(frozen=True)
+class ProductStats:
+    """Catalog summary: size, categories, price range and priciest products"""
+    total_products: int = 0
+    categories: list = field(default_factory=list)
+    price_min: float = 0
+    price_max: float = 0
+    top_products: list = field(default_factory=list)
+
+    @classmethod
+    def for_business(cls, business, top_n=5):
+        """Compute the stats with one aggregate and two narrow queries"""
+        products = Product.objects.filter(business=business)
+        totals = products.aggregate(
+            total=Count('id'), price_min=Min('price'), price_max=Max('price')
+        )
+
+        if not totals['total']:
+            return cls()
+
+        categories = (
+            products.exclude(category__isnull=True)
+            .exclude(category='')
+            .order_by('category')
+            .values_list('category', flat=True)
+            .distinct()
+        )
+        top_products = products.order_by('-price', 'id').values('name', 'price', 'category')
+
+        return cls(
+            total_products=totals['total'],
+            categories=list(categories),
+            price_min=totals['price_min'],
+            price_max=totals['price_max'],
+            top_products=list(top_products[:top_n]),
+        )
+
+    @classmethod
+    def for_businesses(cls, business_ids, top_n=5):
+        """Stats for every business in business_ids from three grouped queries"""
+        products = Product.objects.filter(business_id__in=business_ids)
+        totals = (
+            products.values('business_id')
+            .annotate(total=Count('id'), price_min=Min('price'), price_max=Max('price'))
+            .order_by()
+        )
+
+        categories = defaultdict(list)
+        rows = (
+            products.exclude(category__isnull=True)
+            .exclude(category='')
+            .order_by('business_id', 'category')
+            .values_list('business_id', 'category')
+            .distinct()
+        )
+        for business_id, category in rows:
+            categories[business_id].append(category)
+
+        top_products = defaultdict(list)
+        ranked = (
+            products.annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F('business_id'),
+                    order_by=[F('price').desc(), F('id').asc()],
+                )
+            )
+            .filter(rank__lte=top_n)
+            .order_by('business_id', 'rank')
+            .values('business_id', 'name', 'price', 'category')
+        )
+        for row in ranked:
+            top_products[row.pop('business_id')].append(row)
+
+        stats = {business_id: cls() for business_id in business_ids}
+        for row in totals:
+            business_id = row['business_id']
+            stats[business_id] = cls(
+                total_products=row['total'],
+                categories=categories[business_id],
+                price_min=row['price_min'],
+                price_max=row['price_max'],
+                top_products=top_products[business_id],
+            )
+        return stats
+
+    def as_dict(self):
+        """Shape used by campaign analysis and the stats endpoint"""
+        return {
+            'total_products': self.total_products,
+            'categories': list(self.categories),
+            'price_range': {'min': self.price_min, 'max': self.price_max},
+            'top_products': list(self.top_products),
+        }
+
+
+def product_analysis(business):
+    """ProductStats for the business as a dict, served from the analysis cache"""
+    return cached_analysis(
+        business, 'products', lambda: ProductStats.for_business(business).as_dict()
+    )
+
+
+def product_analyses(businesses):
+    """product_analysis for many businesses, keyed by business id"""
+    return cached_analyses(
+        businesses,
+        'products',
+        lambda business_ids: {
+            business_id: stats.as_dict()
+            for business_id, stats in ProductStats.for_businesses(business_ids).items()
+        },
+    )
+
+
+def compute_sales_analyses(business_ids, top_n=5):
+    """Sales totals and best sellers per business from the daily rollup, in two queries"""
+    sales = DailyProductSales.objects.filter(business_id__in=business_ids)
+    totals = (
+        sales.values('business_id')
+        .annotate(
+            records=Sum('records'),
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('revenue'),
+        )
+        .order_by()
+    )
+
+    top_selling = defaultdict(list)
+    ranked = (
+        sales.values('business_id', 'product__name')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F('business_id'),
+                order_by=[F('quantity').desc(), F('product__name').asc()],
+            )
+        )
+        .filter(rank__lte=top_n)
+        .order_by('business_id', 'rank')
+    )
+    for row in ranked:
+        top_selling[row['business_id']].append({
+            'product': row['product__name'],
+            'quantity': row['quantity'],
+            'revenue': row['revenue'],
+        })
+
+    analyses = {
+        business_id: {'total_sales': 0, 'total_revenue': 0, 'trends': []}
+        for business_id in business_ids
+    }
+    for row in totals:
+        if row['records']:
+            analyses[row['business_id']] = {
+                'total_sales': row['total_quantity'],
+                'total_revenue': row['total_revenue'],
+                'top_selling': top_selling[row['business_id']],
+            }
+    return analyses
+
+
+def sales_analysis(business):
+    """Sales summary for the business, served from the analysis cache"""
+    return cached_analysis(
+        business, 'sales', lambda: compute_sales_analyses([business.id])[business.id]
+    )
+
+
+def sales_analyses(businesses):
+    """sales_analysis for many businesses, keyed by business id"""
+    return cached_analyses(businesses, 'sales', compute_sales_analyses)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BusinessDataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'business_data'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,228 @@
+"""
+Import and API Benchmarks
+Synthetic workloads run through `python manage.py benchmark <name>`
+"""
+import datetime
+import io
+import time
+
+from django.db import connection, transaction
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+from .cleaning import clean_product_frame, clean_sales_frame
+from .importers import CopySalesImporter, SalesImporter
+from .models import Product, SalesRecord
+from .serializers import SalesRecordListSerializer, SalesRecordSerializer
+
+
+def timed(func, *args, **kwargs):
+    """Return (result, seconds) for a single call"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def make_sales_frame(rows):
+    """Build a sales upload with roughly 1% invalid rows of each kind"""
+    df = pd.DataFrame({
+        'product_name': [f'Product {i % 500}' for i in range(rows)],
+        'quantity': [str(i % 9 + 1) for i in range(rows)],
+        'date': [f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}' for i in range(rows)],
+        'revenue': [str(i % 50 * 10) if i % 3 else None for i in range(rows)],
+        'channel': ['online' if i % 2 else None for i in range(rows)],
+    })
+    df.loc[df.index % 100 == 1, 'product_name'] = None
+    df.loc[df.index % 100 == 2, 'quantity'] = 'two'
+    return df
+
+
+def make_product_frame(rows):
+    """Build a product upload with an extra attribute column"""
+    df = pd.DataFrame({
+        'name': [f'Product {i}' for i in range(rows)],
+        'price': [str(i % 1000) for i in range(rows)],
+        'cost_price': [str(i % 700) for i in range(rows)],
+        'category': [f'Category {i % 20}' for i in range(rows)],
+        'color': ['red' if i % 2 else 'blue' for i in range(rows)],
+    })
+    df.loc[df.index % 100 == 1, 'name'] = None
+    df.loc[df.index % 100 == 2, 'price'] = 'n/a'
+    return df
+
+
+def legacy_clean_sales(df):
+    """The per-row validation the sales upload view used to run"""
+    cleaned = []
+    for _, row in df.iterrows():
+        raw_data = row.to_dict()
+        product_name = raw_data.get('product_name')
+        quantity = raw_data.get('quantity')
+        date = raw_data.get('date')
+
+        if not product_name or not date or not quantity:
+            cleaned.append((raw_data, 'Missing required fields'))
+            continue
+
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            cleaned.append((raw_data, 'Quantity must be a number'))
+            continue
+
+        cleaned.append((raw_data, None))
+    return cleaned
+
+
+def legacy_clean_products(df):
+    """The per-row validation the product upload view used to run"""
+    reserved = {'name', 'price', 'cost_price', 'category'}
+    cleaned = []
+    for _, row in df.iterrows():
+        raw_data = row.to_dict()
+        name = raw_data.get('name')
+
+        if not name or str(name).strip() == '':
+            cleaned.append((raw_data, 'Missing required product name'))
+            continue
+
+        try:
+            price = float(raw_data.get('price', 0) or 0)
+            cost_price = float(raw_data.get('cost_price', 0) or 0)
+        except (TypeError, ValueError):
+            cleaned.append((raw_data, 'Price must be a number'))
+            continue
+
+        attributes = {k: v for k, v in raw_data.items() if k not in reserved}
+        cleaned.append(((price, cost_price, attributes), None))
+    return cleaned
+
+
+def bench_cleaning(rows=100000, **options):
+    """Compare the iterrows validation loop with the vectorized cleaners"""
+    report = []
+    for label, make_frame, legacy, vectorized in (
+        ('sales', make_sales_frame, legacy_clean_sales, clean_sales_frame),
+        ('products', make_product_frame, legacy_clean_products, clean_product_frame),
+    ):
+        df = make_frame(rows)
+        _, legacy_seconds = timed(legacy, df)
+        _, vectorized_seconds = timed(vectorized, df)
+        report.append({
+            'workload': f'{label} cleaning ({rows} rows)',
+            'baseline_s': round(legacy_seconds, 3),
+            'optimized_s': round(vectorized_seconds, 3),
+            'speedup': round(legacy_seconds / vectorized_seconds, 1),
+        })
+    return report
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic rows a database benchmark created"""
+
+
+def seed_business(rows, products=200):
+    """Create a throwaway business with `rows` sales inside the current transaction"""
+    from users.models import Business, User
+
+    owner = User.objects.create_user(
+        email=f'benchmark-{time.time_ns()}@example.com',
+        password=None,
+        first_name='Bench',
+        last_name='Mark',
+        phone='0',
+    )
+    business = Business.objects.create(owner=owner, name='Benchmark', industry='retail')
+    catalog = Product.objects.bulk_create(
+        Product(business=business, name=f'Product {i}', price=i % 100 + 1)
+        for i in range(products)
+    )
+    start = datetime.date(2024, 1, 1)
+    SalesRecord.objects.bulk_create(
+        (
+            SalesRecord(
+                business=business,
+                product=catalog[i % products],
+                date=start + datetime.timedelta(days=i % 365),
+                quantity=i % 9 + 1,
+                revenue=float(i % 900),
+            )
+            for i in range(rows)
+        ),
+        batch_size=1000,
+    )
+    return business
+
+
+def bench_listing(rows=100000, **options):
+    """Compare ModelSerializer sales listing with the values() fast path"""
+    report = []
+    try:
+        with transaction.atomic():
+            business = seed_business(rows)
+            sales = SalesRecord.objects.filter(business=business)
+
+            _, model_seconds = timed(
+                lambda: SalesRecordSerializer(sales.order_by('-date'), many=True).data
+            )
+            _, joined_seconds = timed(
+                lambda: SalesRecordSerializer(
+                    sales.select_related('product').order_by('-date'), many=True
+                ).data
+            )
+            _, values_seconds = timed(
+                lambda: SalesRecordListSerializer(
+                    SalesRecordListSerializer.values(sales.order_by('-date', '-id')), many=True
+                ).data
+            )
+
+            for label, seconds in (
+                ('ModelSerializer + select_related', joined_seconds),
+                ('values() + SalesRecordListSerializer', values_seconds),
+            ):
+                report.append({
+                    'workload': f'sales listing, {label} ({rows} rows)',
+                    'baseline_s': round(model_seconds, 3),
+                    'optimized_s': round(seconds, 3),
+                    'speedup': round(model_seconds / seconds, 1),
+                    'rows_per_s': round(rows / seconds),
+                })
+            raise Rollback
+    except Rollback:
+        pass
+    return report
+
+
+def bench_copy(rows=1000000, **options):
+    """Compare the ORM sales importer with the Postgres COPY importer on one CSV"""
+    if connection.vendor != 'postgresql':
+        return [{'workload': 'sales import, COPY', 'skipped': 'requires Postgres (USE_SQLITE=false)'}]
+
+    data = make_sales_frame(rows).to_csv(index=False).encode()
+    seconds = {}
+    for label, importer_class in (('orm', SalesImporter), ('copy', CopySalesImporter)):
+        try:
+            with transaction.atomic():
+                importer = importer_class(seed_business(0))
+                _, seconds[label] = timed(importer.import_csv, io.BytesIO(data))
+                raise Rollback
+        except Rollback:
+            pass
+
+    return [{
+        'workload': f'sales import, bulk_create vs COPY ({rows} rows)',
+        'baseline_s': round(seconds['orm'], 3),
+        'optimized_s': round(seconds['copy'], 3),
+        'speedup': round(seconds['orm'] / seconds['copy'], 1),
+        'rows_per_s': round(rows / seconds['copy']),
+    }]
+
+
+BENCHMARKS = {
+    'cleaning': bench_cleaning,
+    'copy': bench_copy,
+    'listing': bench_listing,
+}
@@ -0,0 +1,123 @@
+"""
+Analysis Cache
+Campaign analysis is cached per business under a data version that is bumped
+whenever the business's products or sales change, so stale entries are never
+read and simply expire.
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+ANALYSIS_STATS = 'analysis-cache'
+
+
+def _version_key(business_id):
+    return f'business:{business_id}:data-version'
+
+
+def _fresh_version():
+    # Time-based so a version evicted from the cache never comes back lower
+    return time.time_ns()
+
+
+def get_version(key):
+    """Read a version counter, seeding it if it is missing"""
+    version = cache.get(key)
+    if version is None:
+        version = _fresh_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), timeout=None)
+
+
+def get_data_version(business_id):
+    return get_version(_version_key(business_id))
+
+
+def bump_data_version(business_id):
+    """Invalidate every cached analysis for the business"""
+    bump_version(_version_key(business_id))
+
+
+def bump_on_commit(business_id):
+    """Bump once the surrounding transaction commits, so readers can't cache old data"""
+    transaction.on_commit(partial(bump_data_version, business_id))
+
+
+def record_lookup(namespace, hit, count=1):
+    """Count count cache hits or misses under namespace"""
+    if not count:
+        return
+    key = f'{namespace}:{"hits" if hit else "misses"}'
+    try:
+        cache.incr(key, count)
+    except ValueError:
+        if not cache.add(key, count, timeout=None):
+            cache.incr(key, count)
+
+
+def lookup_stats(namespace):
+    """Hit/miss counters shared by every process using the same cache"""
+    stats = {name: cache.get(f'{namespace}:{name}', 0) for name in ('hits', 'misses')}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total, 3) if total else 0
+    return stats
+
+
+def cached_analysis(business, name, compute):
+    """Return compute() for the business, cached under its current data version"""
+    key = f'analysis:{business.id}:{name}:{get_data_version(business.id)}'
+    result = cache.get(key)
+    record_lookup(ANALYSIS_STATS, hit=result is not None)
+    if result is not None:
+        return result
+
+    result = compute()
+    cache.set(key, result, timeout=getattr(settings, 'ANALYSIS_CACHE_TIMEOUT', 3600))
+    return result
+
+
+def cached_analyses(businesses, name, compute_many):
+    """
+    Like cached_analysis for many businesses at once: entries are read with
+    one get_many and compute_many(business_ids) fills in the misses, returning
+    a dict keyed by business id
+    """
+    version_keys = {business.id: _version_key(business.id) for business in businesses}
+    versions = cache.get_many(version_keys.values())
+    keys = {
+        business_id: f'analysis:{business_id}:{name}:'
+        f'{versions.get(version_key) or get_version(version_key)}'
+        for business_id, version_key in version_keys.items()
+    }
+
+    found = cache.get_many(keys.values())
+    results = {
+        business_id: found[key] for business_id, key in keys.items() if key in found
+    }
+    missing = [business_id for business_id in keys if business_id not in results]
+    record_lookup(ANALYSIS_STATS, hit=True, count=len(results))
+    record_lookup(ANALYSIS_STATS, hit=False, count=len(missing))
+
+    if missing:
+        computed = compute_many(missing)
+        cache.set_many(
+            {keys[business_id]: computed[business_id] for business_id in missing},
+            timeout=getattr(settings, 'ANALYSIS_CACHE_TIMEOUT', 3600),
+        )
+        results.update(computed)
+    return results
+
+
+def analysis_cache_stats():
+    return lookup_stats(ANALYSIS_STATS)
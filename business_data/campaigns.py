@@ -0,0 +1,394 @@
+"""
+Background Campaign Generation
+Campaign requests are stored as pending Campaign rows and generated outside
+the request on a bounded thread pool or by the process_campaigns command.
+At most CAMPAIGN_MAX_PER_BUSINESS campaigns run at once for one business;
+the rest wait as pending and are started as running ones finish. A claim is a
+lease of CAMPAIGN_LEASE_SECONDS from started_at: a run that outlives it is
+treated as abandoned (crash, restart, hung thread), stops counting towards
+the limit and is queued again, up to CAMPAIGN_MAX_ATTEMPTS claims.
+A campaign can also be generated inside the request and streamed to the
+client section by section as server-sent events. Campaigns for many
+businesses are queued together by the batch endpoint, or generated offline
+from a single analysis pass by the generate_campaign_batch command.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from users.models import Business
+from .aiservice import CampaignGenerator
+from .analytics import product_analyses, sales_analyses
+from .models import Campaign
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+# Serialises claims inside this process; the Business row lock does the same
+# across processes on Postgres
+_claim_lock = threading.Lock()
+
+
+def get_executor():
+    """Lazily create the process-wide pool used in 'thread' mode"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CAMPAIGN_WORKERS', 4),
+            thread_name_prefix='campaign',
+        )
+    return _executor
+
+
+def get_business_limit():
+    return getattr(settings, 'CAMPAIGN_MAX_PER_BUSINESS', 2)
+
+
+def uses_thread_pool():
+    return getattr(settings, 'CAMPAIGN_JOBS_MODE', 'thread') == 'thread'
+
+
+def lease_cutoff():
+    """Runs started before this have outlived their lease"""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CAMPAIGN_LEASE_SECONDS', 600))
+
+
+def enqueue_campaign(business, goal, budget, user=None):
+    """Store a pending campaign and hand it to the configured runner"""
+    reclaim_business_campaigns(business.id)
+    campaign = Campaign.objects.create(
+        business=business,
+        goal=goal,
+        budget=budget,
+        created_by_id=user.id if user else None,
+    )
+
+    if uses_thread_pool():
+        transaction.on_commit(lambda: get_executor().submit(run_campaign_in_thread, campaign.id))
+
+    return campaign
+
+
+def enqueue_batch(businesses, goal, budget, user=None):
+    """
+    Store one pending campaign per business in a single insert and queue them
+    all. The analyses are computed first with the grouped queries, so each
+    queued run reads its business's summary from the analysis cache.
+    """
+    businesses = list(businesses)
+    product_analyses(businesses)
+    sales_analyses(businesses)
+
+    campaigns = Campaign.objects.bulk_create([
+        Campaign(
+            business=business,
+            goal=goal,
+            budget=budget,
+            created_by_id=user.id if user else None,
+        )
+        for business in businesses
+    ])
+
+    if uses_thread_pool():
+        def submit():
+            for campaign in campaigns:
+                get_executor().submit(run_campaign_in_thread, campaign.id)
+
+        transaction.on_commit(submit)
+
+    return campaigns
+
+
+def start_streamed_campaign(business, goal, budget, user=None):
+    """
+    Create a campaign and claim it for generation in the caller's stream.
+    Returns (campaign, claimed); when the business is at its limit the
+    campaign is queued as enqueue_campaign would have done.
+    """
+    reclaim_business_campaigns(business.id)
+    campaign = Campaign.objects.create(
+        business=business,
+        goal=goal,
+        budget=budget,
+        created_by_id=user.id if user else None,
+    )
+
+    if claim_campaign(campaign.id, business.id):
+        campaign.refresh_from_db(fields=['status', 'started_at', 'attempts'])
+        return campaign, True
+
+    if uses_thread_pool():
+        transaction.on_commit(lambda: get_executor().submit(run_campaign_in_thread, campaign.id))
+    return campaign, False
+
+
+def claim_campaign(campaign_id, business_id):
+    """Move a pending campaign to running unless its business is at the concurrency limit"""
+    with _claim_lock, transaction.atomic():
+        list(Business.objects.select_for_update().filter(id=business_id).values_list('id'))
+        running = Campaign.objects.filter(
+            business_id=business_id, status='running', started_at__gte=lease_cutoff()
+        ).count()
+        if running >= get_business_limit():
+            return False
+        return bool(
+            Campaign.objects.filter(id=campaign_id, status='pending').update(
+                status='running', started_at=timezone.now(), attempts=F('attempts') + 1
+            )
+        )
+
+
+def claim_next_campaign():
+    """Claim the oldest pending campaign whose business has a free slot"""
+    limit = get_business_limit()
+    live = Q(campaigns__status='running', campaigns__started_at__gte=lease_cutoff())
+    busy = (
+        Business.objects.annotate(running=Count('campaigns', filter=live))
+        .filter(running__gte=limit)
+        .values('id')
+    )
+    pending = (
+        Campaign.objects.filter(status='pending')
+        .exclude(business_id__in=busy)
+        .order_by('created_at')
+        .values_list('id', 'business_id')
+    )
+    for campaign_id, business_id in pending[:10]:
+        if claim_campaign(campaign_id, business_id):
+            return Campaign.objects.select_related('business').get(id=campaign_id)
+    return None
+
+
+def run_campaign_in_thread(campaign_id):
+    """Entry point for the thread pool; owns its own database connection"""
+    close_old_connections()
+    try:
+        campaign = Campaign.objects.filter(id=campaign_id).values('business_id').first()
+        if campaign and claim_campaign(campaign_id, campaign['business_id']):
+            campaign = run_campaign(Campaign.objects.select_related('business').get(id=campaign_id))
+            start_waiting(campaign.business_id)
+    finally:
+        close_old_connections()
+
+
+def reclaim_stale_campaigns(business_id=None):
+    """
+    Queue running campaigns whose lease has expired again, or fail them once
+    they have used CAMPAIGN_MAX_ATTEMPTS claims. Returns (requeued, failed).
+    """
+    stale = Campaign.objects.filter(status='running', started_at__lt=lease_cutoff())
+    if business_id is not None:
+        stale = stale.filter(business_id=business_id)
+    max_attempts = getattr(settings, 'CAMPAIGN_MAX_ATTEMPTS', 3)
+
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed',
+        error_message=f'Abandoned after {max_attempts} attempts',
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status='pending', started_at=None)
+    if requeued or failed:
+        logger.warning('Reclaimed stale campaigns: %s requeued, %s failed', requeued, failed)
+    return requeued, failed
+
+
+def reclaim_business_campaigns(business_id):
+    """
+    Reclaim the business's stale runs whenever it is touched, so an abandoned
+    campaign doesn't wait for a restart or another run to finish. In thread
+    mode the requeued ones are submitted again once the caller commits.
+    """
+    requeued, failed = reclaim_stale_campaigns(business_id)
+    if requeued and uses_thread_pool():
+        transaction.on_commit(partial(start_waiting, business_id))
+    return requeued, failed
+
+
+def resume_campaigns():
+    """
+    Thread mode: after a restart nothing holds the pending campaigns of the
+    previous process, so reclaim stale runs and submit every waiting business
+    """
+    close_old_connections()
+    try:
+        reclaim_stale_campaigns()
+        pending = Campaign.objects.filter(status='pending').values_list('business_id', flat=True)
+        for business_id in pending.order_by().distinct():
+            start_waiting(business_id)
+    finally:
+        close_old_connections()
+
+
+def start_waiting(business_id):
+    """
+    Submit the oldest pending campaigns held back by the business limit.
+    Several finishing campaigns may submit the same one; only one claim wins.
+    """
+    reclaim_stale_campaigns(business_id)
+    waiting = (
+        Campaign.objects.filter(business_id=business_id, status='pending')
+        .order_by('created_at')
+        .values_list('id', flat=True)[:get_business_limit()]
+    )
+    for campaign_id in waiting:
+        get_executor().submit(run_campaign_in_thread, campaign_id)
+
+
+def run_campaign(campaign, provider=None):
+    """Generate a claimed campaign and record the outcome"""
+    generator = CampaignGenerator(campaign.business, provider=provider)
+
+    try:
+        campaign.payload = generator.generate_campaign(goal=campaign.goal, budget=campaign.budget)
+    except Exception as exc:
+        logger.exception('Campaign %s failed', campaign.id)
+        campaign.status = 'failed'
+        campaign.error_message = str(exc)
+    else:
+        campaign.status = 'done'
+
+    finish_campaign(campaign)
+    return campaign
+
+
+def finish_campaign(campaign):
+    """
+    Store the outcome of a run, unless its lease was reclaimed meanwhile:
+    started_at is the fencing token, so a late run can't overwrite a newer one
+    """
+    campaign.finished_at = timezone.now()
+    saved = Campaign.objects.filter(
+        id=campaign.id, status='running', started_at=campaign.started_at
+    ).update(
+        payload=campaign.payload,
+        status=campaign.status,
+        error_message=campaign.error_message,
+        finished_at=campaign.finished_at,
+    )
+    if not saved:
+        logger.warning('Campaign %s lost its lease; discarding its result', campaign.id)
+    return bool(saved)
+
+
+def stream_campaign(campaign, provider=None):
+    """
+    Generate a claimed campaign, yielding (event, section, value) as each part
+    is ready, then ('done', None, None) or ('error', None, message). The
+    payload is saved once every section is in; a client that disconnects
+    first leaves the campaign failed.
+    """
+    generator = CampaignGenerator(campaign.business, provider=provider)
+    sections = {}
+    error = 'Stream closed before completion'
+
+    try:
+        for event, section, value in generator.iter_campaign(
+            goal=campaign.goal, budget=campaign.budget, stream=True
+        ):
+            if event == 'section':
+                sections[section] = value
+            yield event, section, value
+        error = None
+    except Exception as exc:
+        logger.exception('Campaign %s failed', campaign.id)
+        error = str(exc)
+    finally:
+        if error is None:
+            campaign.payload = generator.build_payload(sections)
+            campaign.status = 'done'
+        else:
+            campaign.status = 'failed'
+            campaign.error_message = error
+        finish_campaign(campaign)
+        if uses_thread_pool():
+            start_waiting(campaign.business_id)
+
+    if error is None:
+        yield 'done', None, None
+    else:
+        yield 'error', None, error
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def campaign_event_stream(campaign, provider=None):
+    """Server-sent events for a streamed campaign, one per yield so nothing is held back"""
+    yield sse_event('campaign', {'id': campaign.id, 'status': campaign.status})
+    for event, section, value in stream_campaign(campaign, provider=provider):
+        if event == 'section':
+            yield sse_event('section', {'name': section, 'value': value})
+        elif event == 'token':
+            yield sse_event('token', {'section': section, 'text': value})
+        elif event == 'done':
+            yield sse_event('done', {'id': campaign.id, 'status': campaign.status})
+        else:
+            yield sse_event('error', {'id': campaign.id, 'error': value})
+
+
+def generate_batch(businesses, goal, budget, user=None, provider=None, chunk_size=None):
+    """
+    Generate one campaign per business outside the queue. Each chunk of
+    businesses shares one grouped analysis pass, is generated on a pool of
+    CAMPAIGN_BATCH_WORKERS threads and written with a single bulk_create.
+    Campaigns that fail are stored as failed rather than stopping the batch.
+    """
+    chunk_size = chunk_size or getattr(settings, 'CAMPAIGN_BATCH_SIZE', 100)
+    build = partial(build_batch_campaign, goal=goal, budget=budget, user=user, provider=provider)
+    businesses = iter(businesses)
+    created = []
+
+    with ThreadPoolExecutor(
+        max_workers=getattr(settings, 'CAMPAIGN_BATCH_WORKERS', 8),
+        thread_name_prefix='campaign-batch',
+    ) as executor:
+        while True:
+            chunk = list(islice(businesses, chunk_size))
+            if not chunk:
+                return created
+
+            products = product_analyses(chunk)
+            sales = sales_analyses(chunk)
+            analyses = [
+                {'products': products[business.id], 'sales': sales[business.id]}
+                for business in chunk
+            ]
+            campaigns = list(executor.map(build, chunk, analyses))
+            created.extend(Campaign.objects.bulk_create(campaigns))
+
+
+def build_batch_campaign(business, analysis, goal, budget, user=None, provider=None):
+    """
+    Generate an unsaved campaign from a precomputed analysis; runs on the
+    batch pool and never touches the database
+    """
+    campaign = Campaign(
+        business=business,
+        goal=goal,
+        budget=budget,
+        created_by_id=user.id if user else None,
+        started_at=timezone.now(),
+    )
+    generator = CampaignGenerator(business, provider=provider, analysis=analysis)
+
+    try:
+        campaign.payload = generator.generate_campaign(goal=goal, budget=budget)
+    except Exception as exc:
+        logger.exception('Batch campaign for %s failed', business.slug)
+        campaign.status = 'failed'
+        campaign.error_message = str(exc)
+    else:
+        campaign.status = 'done'
+
+    campaign.finished_at = timezone.now()
+    return campaign
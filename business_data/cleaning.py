@@ -0,0 +1,105 @@
+"""
+Upload Cleaning Rules
+Validates and normalises uploaded frames with column operations instead of
+per-row Python. Every cleaner returns a frame aligned with its input that
+carries an `error_message` column (None for rows that passed).
+"""
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+PRODUCT_RESERVED_FIELDS = ('name', 'price', 'cost_price', 'category')
+
+
+def _column(df, name, default=None):
+    """Return a column as an object Series, or a constant one if it is absent"""
+    if name in df.columns:
+        return df[name].astype(object)
+    return pd.Series(default, index=df.index, dtype=object)
+
+
+def _is_blank(series):
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+
+def _no_errors(df):
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _flag(errors, mask, message):
+    """Record message on rows matching mask that have not failed yet"""
+    errors[mask & errors.isna()] = message
+
+
+def clean_product_frame(df):
+    """Clean a product upload: name, numeric prices, category and attributes"""
+    names = _column(df, 'name')
+    raw_price = _column(df, 'price')
+    raw_cost_price = _column(df, 'cost_price')
+    price = pd.to_numeric(raw_price, errors='coerce')
+    cost_price = pd.to_numeric(raw_cost_price, errors='coerce')
+
+    errors = _no_errors(df)
+    _flag(errors, _is_blank(names), 'Missing required product name')
+    _flag(
+        errors,
+        (raw_price.notna() & price.isna()) | (raw_cost_price.notna() & cost_price.isna()),
+        'Price must be a number',
+    )
+
+    attribute_columns = [c for c in df.columns if c not in PRODUCT_RESERVED_FIELDS]
+    attributes = df[attribute_columns]
+    attributes = attributes.astype(object).where(attributes.notna(), None)
+    # to_dict('records') on a frame without columns yields no rows at all
+    records = attributes.to_dict('records') if attribute_columns else [{}] * len(df)
+
+    return pd.DataFrame({
+        'name': names.where(names.isna(), names.astype(str)),
+        'price': price.fillna(0).astype(float),
+        'cost_price': cost_price.fillna(0).astype(float),
+        'category': _column(df, 'category').fillna('').astype(str),
+        'attributes': records,
+        'error_message': errors,
+    }, index=df.index)
+
+
+def clean_sales_frame(df):
+    """Clean a sales upload: required fields, whole quantities and parsed dates"""
+    names = _column(df, 'product_name')
+    raw_quantity = _column(df, 'quantity')
+    raw_date = _column(df, 'date')
+    quantity = pd.to_numeric(raw_quantity, errors='coerce')
+    date = pd.to_datetime(raw_date, errors='coerce', format='mixed')
+
+    errors = _no_errors(df)
+    _flag(
+        errors,
+        _is_blank(names) | _is_blank(raw_date) | _is_blank(raw_quantity) | (quantity == 0),
+        'Missing required fields',
+    )
+    # 1.5 would otherwise be truncated to 1 by the int64 cast below
+    _flag(errors, quantity.isna() | (quantity % 1 != 0), 'Quantity must be a number')
+    _flag(errors, date.isna(), 'Invalid date')
+
+    valid = errors.isna()
+    return pd.DataFrame({
+        'product_name': names.where(names.isna(), names.astype(str)),
+        'quantity': quantity.where(valid, 0).astype('int64'),
+        'date': date.dt.date.where(valid, None),
+        'revenue': pd.to_numeric(_column(df, 'revenue'), errors='coerce'),
+        'channel': _column(df, 'channel').fillna('offline').astype(str),
+        'error_message': errors,
+    }, index=df.index)
+
+
+def sales_row_keys(cleaned):
+    """Normalised identity of each valid cleaned sales row, used for fingerprints"""
+    revenue = cleaned['revenue'].round(2)
+    return (
+        cleaned['product_name'].astype(str).str.strip()
+        + '|' + cleaned['date'].astype(str)
+        + '|' + cleaned['quantity'].astype(str)
+        + '|' + revenue.astype(str).where(revenue.notna(), '')
+        + '|' + cleaned['channel'].str.strip()
+    )
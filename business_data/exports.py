@@ -0,0 +1,113 @@
+"""
+Streaming Exports
+Streams business data as CSV or NDJSON, optionally gzipped, straight from a
+values() iterator so memory stays flat no matter how many rows are exported
+"""
+import csv
+import json
+import zlib
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .models import Campaign, Product, SalesRecord
+from .serializers import CampaignListSerializer, ProductListSerializer, SalesRecordListSerializer
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows are joined into pieces of roughly this size before being yielded
+STREAM_PIECE_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """What an export reads: model, row serializer, ordering and date column"""
+    model: type
+    serializer: type
+    ordering: tuple
+    date_lookup: str
+
+    def queryset(self, business, start=None, end=None):
+        queryset = self.model.objects.filter(business=business)
+        if start:
+            queryset = queryset.filter(**{f'{self.date_lookup}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{self.date_lookup}__lte': end})
+        return self.serializer.values(queryset.order_by(*self.ordering))
+
+
+EXPORTS = {
+    'products': ExportSpec(Product, ProductListSerializer, ('id',), 'created_at__date'),
+    'sales': ExportSpec(SalesRecord, SalesRecordListSerializer, ('date', 'id'), 'date'),
+    'campaigns': ExportSpec(Campaign, CampaignListSerializer, ('id',), 'created_at__date'),
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(serializer, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(serializer.fields)
+    for row in rows:
+        item = serializer.to_representation(row)
+        yield writer.writerow(
+            json.dumps(value) if isinstance(value, (dict, list)) else value
+            for value in item.values()
+        )
+
+
+def ndjson_lines(serializer, rows):
+    for row in rows:
+        yield json.dumps(serializer.to_representation(row)) + '\n'
+
+
+FORMATTERS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
+
+
+def encoded_pieces(lines):
+    """Batch text lines into bytes pieces of about STREAM_PIECE_SIZE"""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= STREAM_PIECE_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def gzipped(pieces):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for piece in pieces:
+        compressed = compressor.compress(piece)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(kind, business, export_type='csv', compress='none', start=None, end=None):
+    """Return an iterator of bytes for the export"""
+    spec = EXPORTS[kind]
+    rows = spec.queryset(business, start, end).iterator(
+        chunk_size=getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    )
+    pieces = encoded_pieces(FORMATTERS[export_type](spec.serializer, rows))
+    return gzipped(pieces) if compress == 'gzip' else pieces
+
+
+def export_filename(business, kind, export_type, compress):
+    filename = f'{business.slug}-{kind}.{export_type}'
+    return f'{filename}.gz' if compress == 'gzip' else filename
@@ -0,0 +1,371 @@
+"""
+CSV Import Engine
+Persists uploaded rows in batches instead of issuing several queries per row
+"""
+import hashlib
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import Business
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+    CSV_READ_ERRORS = (UnicodeDecodeError,)
+else:
+    CSV_READ_ERRORS = (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError)
+
+from .cache import bump_on_commit
+from .cleaning import clean_product_frame, clean_sales_frame, sales_row_keys
+from .models import Product, RawProductRecord, RawSalesRecord, SalesRecord
+from .pgcopy import copy_raw_sales, copy_sales
+from .rollups import apply_deltas, sales_deltas
+
+
+def get_batch_size(batch_size=None):
+    """Resolve the chunk size used for bulk writes"""
+    return batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+
+
+def iter_chunks(df, batch_size):
+    """Yield consecutive slices of a DataFrame"""
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def frame_records(df):
+    """Convert a DataFrame to row dicts with blank cells as None rather than NaN"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def read_csv_chunks(file, batch_size, dtype=None):
+    """Stream a CSV file as DataFrames of at most batch_size rows"""
+    return pd.read_csv(file, chunksize=batch_size, dtype=dtype)
+
+
+class BaseImporter:
+    """Shared chunking and progress reporting for CSV importers"""
+    RESULT_KEYS = ()
+    # Text columns are pinned so every chunk parses them the same way
+    CSV_DTYPES = {}
+    raw_model = None
+
+    def __init__(self, business, batch_size=None, progress=None):
+        self.business = business
+        self.batch_size = get_batch_size(batch_size)
+        self.progress = progress
+        self.results = {key: 0 for key in self.RESULT_KEYS}
+        self._products = None
+
+    def import_csv(self, file):
+        """Stream a CSV upload and import it one bounded chunk at a time"""
+        with read_csv_chunks(file, self.batch_size, self.CSV_DTYPES) as chunks:
+            for chunk in chunks:
+                self.import_frame(chunk)
+        return self.results
+
+    def import_frame(self, df):
+        raise NotImplementedError
+
+    def raw_record(self, index, raw_data, error_message=None):
+        """The audit row kept for one uploaded row; index is its frame index"""
+        return self.raw_model(
+            business=self.business,
+            raw_row=raw_data,
+            status='error' if error_message else 'cleaned',
+            error_message=error_message,
+        )
+
+    def save_raw_records(self, raw_records):
+        self.raw_model.objects.bulk_create(raw_records, batch_size=self.batch_size)
+
+    def report_progress(self):
+        if self.progress:
+            self.progress(self.results)
+
+
+class ProductImporter(BaseImporter):
+    """Import product rows with one native upsert per chunk"""
+    RESULT_KEYS = ('created', 'updated', 'errors')
+    CSV_DTYPES = {'name': str, 'category': str, 'sku': str}
+    raw_model = RawProductRecord
+    UPDATE_FIELDS = ['price', 'cost_price', 'category', 'attributes']
+
+    def load_existing(self):
+        """Resolve the business's existing product ids by name in one query"""
+        return dict(Product.objects.filter(business=self.business).values_list('name', 'id'))
+
+    def import_frame(self, df):
+        """Import a whole DataFrame chunk by chunk"""
+        if self._products is None:
+            self._products = self.load_existing()
+
+        for chunk in iter_chunks(df, self.batch_size):
+            self.import_chunk(chunk)
+
+        return self.results
+
+    def import_chunk(self, chunk):
+        """Upsert a chunk on (business, name) and write its raw records in one transaction"""
+        products = {}
+        raw_records = []
+
+        cleaned = clean_product_frame(chunk)
+        rows = zip(
+            chunk.index,
+            frame_records(chunk),
+            cleaned['name'],
+            cleaned['price'],
+            cleaned['cost_price'],
+            cleaned['category'],
+            cleaned['attributes'],
+            cleaned['error_message'],
+        )
+
+        for index, raw_data, name, price, cost_price, category, attributes, error_message in rows:
+            if error_message:
+                raw_records.append(self.raw_record(index, raw_data, error_message))
+                self.results['errors'] += 1
+                continue
+
+            # A row may only be upserted once per statement, so later rows win
+            if name in products:
+                self.results['updated'] += 1
+            products[name] = Product(
+                business=self.business,
+                name=name,
+                price=price,
+                cost_price=cost_price,
+                category=category,
+                attributes=attributes,
+            )
+            raw_records.append(self.raw_record(index, raw_data))
+
+        with transaction.atomic():
+            upserted = Product.objects.bulk_create(
+                products.values(),
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['business', 'name'],
+                update_fields=self.UPDATE_FIELDS,
+            )
+            self.save_raw_records(raw_records)
+            bump_on_commit(self.business.id)
+
+        self.count_upserted(upserted)
+        self.report_progress()
+
+    def count_upserted(self, upserted):
+        """Split upserted rows into created and updated using the returned ids"""
+        known_ids = set(self._products.values())
+        for product in upserted:
+            if product.pk is None:
+                # Backend cannot return ids from an upsert; fall back to names seen so far
+                existed = product.name in self._products
+            else:
+                existed = product.pk in known_ids
+                self._products[product.name] = product.pk
+            self.results['updated' if existed else 'created'] += 1
+
+
+class SalesImporter(BaseImporter):
+    """Import sales rows with an in-memory product resolver and bulk inserts"""
+    RESULT_KEYS = ('cleaned', 'duplicates', 'errors')
+    CSV_DTYPES = {'product_name': str, 'date': str, 'channel': str}
+    raw_model = RawSalesRecord
+
+    def __init__(self, business, batch_size=None, progress=None):
+        super().__init__(business, batch_size=batch_size, progress=progress)
+        # Occurrences per distinct row key across the whole upload
+        self._occurrences = Counter()
+        self._error_occurrences = Counter()
+
+    def load_products(self):
+        """Pre-load a name -> (id, price) map of the business's products"""
+        products = Product.objects.filter(business=self.business).values_list(
+            'name', 'id', 'price'
+        )
+        return {name: (product_id, price) for name, product_id, price in products}
+
+    def resolve_products(self, names):
+        """Create every missing product in one bulk step"""
+        if self._products is None:
+            self._products = self.load_products()
+
+        missing = [name for name in dict.fromkeys(names) if name not in self._products]
+        if missing:
+            # A concurrent import may create the same names; keep whichever row won
+            Product.objects.bulk_create(
+                [Product(business=self.business, name=name) for name in missing],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            self._products.update(
+                (name, (product_id, price))
+                for name, product_id, price in Product.objects.filter(
+                    business=self.business, name__in=missing
+                ).values_list('name', 'id', 'price')
+            )
+
+    def fingerprint(self, keys, occurrences=None):
+        """
+        Hash each row key together with how often it has already occurred in
+        this upload, so identical rows within one file stay distinct while a
+        re-upload reproduces the same fingerprints whatever the chunk size.
+        Memory grows with the number of distinct keys, not rows.
+        """
+        occurrences = self._occurrences if occurrences is None else occurrences
+        fingerprints = []
+        for key in keys:
+            fingerprints.append(hashlib.sha256(f'{key}|{occurrences[key]}'.encode()).hexdigest())
+            occurrences[key] += 1
+        return fingerprints
+
+    def error_fingerprints(self, raw_rows):
+        """Fingerprints of rows that failed cleaning, taken over the raw cells"""
+        return self.fingerprint(
+            (json.dumps(raw_data, sort_keys=True, default=str) for raw_data in raw_rows),
+            self._error_occurrences,
+        )
+
+    def find_imported(self, fingerprints):
+        """Fingerprints of this chunk that a previous upload already stored"""
+        return set(
+            SalesRecord.objects.filter(
+                business=self.business, fingerprint__in=fingerprints
+            ).values_list('fingerprint', flat=True)
+        )
+
+    def find_stored_errors(self, fingerprints):
+        """Fingerprints of this chunk's error rows that a previous upload already stored"""
+        return set(
+            RawSalesRecord.objects.filter(
+                business=self.business, fingerprint__in=fingerprints
+            ).values_list('fingerprint', flat=True)
+        )
+
+    def import_frame(self, df):
+        """Clean, deduplicate, resolve and price the whole frame, then write it in chunks"""
+        cleaned = clean_sales_frame(df)
+        errors = cleaned['error_message']
+        valid = cleaned[errors.isna()]
+        raw_rows = frame_records(df)
+
+        failed = [raw_data for raw_data, error in zip(raw_rows, errors) if error]
+        error_fingerprints = self.error_fingerprints(failed)
+        stored_errors = self.find_stored_errors(error_fingerprints)
+        error_fingerprints = iter(error_fingerprints)
+
+        fingerprints = pd.Series(self.fingerprint(sales_row_keys(valid)), index=valid.index)
+        imported = fingerprints.isin(self.find_imported(fingerprints.tolist()))
+        duplicates = set(valid.index[imported])
+        valid = valid[~imported]
+        fingerprints = fingerprints[~imported]
+        self.results['duplicates'] += len(duplicates)
+
+        names = valid['product_name'].unique()
+        self.resolve_products(names)
+        product_ids = valid['product_name'].map({name: self._products[name][0] for name in names})
+        prices = valid['product_name'].map({name: self._products[name][1] for name in names})
+
+        calculated_revenue = prices * valid['quantity']
+        revenue = valid['revenue'].where(
+            valid['revenue'].notna() & (valid['revenue'] != 0), calculated_revenue
+        )
+
+        sales = {
+            index: SalesRecord(
+                business=self.business,
+                product_id=product_id,
+                quantity=quantity,
+                date=date,
+                revenue=revenue_value,
+                channel=channel,
+                fingerprint=fingerprint,
+            )
+            for index, product_id, quantity, date, revenue_value, channel, fingerprint in zip(
+                valid.index,
+                product_ids.tolist(),
+                valid['quantity'].tolist(),
+                valid['date'],
+                revenue.astype(float).tolist(),
+                valid['channel'],
+                fingerprints,
+            )
+        }
+
+        # Each chunk row is (raw record, sale), with no sale for error rows
+        rows = []
+        for index, raw_data, error_message in zip(df.index, raw_rows, errors):
+            if index in duplicates:
+                continue
+
+            record = self.raw_record(index, raw_data, error_message)
+            if error_message:
+                record.fingerprint = next(error_fingerprints)
+                if record.fingerprint in stored_errors:
+                    # A partial re-upload repeats rows that failed last time
+                    self.results['errors'] += 1
+                    continue
+            rows.append((record, None if error_message else sales[index]))
+
+            if len(rows) == self.batch_size:
+                self.write_chunk(rows)
+                rows = []
+
+        if rows:
+            self.write_chunk(rows)
+
+        return self.results
+
+    def write_chunk(self, rows):
+        """Persist one chunk of sales and raw records in a single transaction"""
+        with transaction.atomic():
+            inserted = self.save_sales([sale for _, sale in rows if sale is not None])
+            # Rows an overlapping upload stored first are duplicates and keep no raw record
+            self.save_raw_records([
+                record for record, sale in rows if sale is None or sale.fingerprint in inserted
+            ])
+            sales = [sale for _, sale in rows if sale is not None and sale.fingerprint in inserted]
+            apply_deltas(sales_deltas(sales))
+            bump_on_commit(self.business.id)
+
+        errors = sum(sale is None for _, sale in rows)
+        self.results['cleaned'] += len(sales)
+        self.results['duplicates'] += len(rows) - errors - len(sales)
+        self.results['errors'] += errors
+        self.report_progress()
+
+    def save_sales(self, sales):
+        """Insert the chunk's new sales; returns the fingerprints actually inserted"""
+        # Overlapping uploads for one business take turns, so the check below
+        # sees every row they committed; ignore_conflicts is the backstop
+        list(
+            Business.objects.select_for_update(no_key=True)
+            .filter(id=self.business.id)
+            .values_list('id', flat=True)
+        )
+        imported = self.find_imported([sale.fingerprint for sale in sales])
+        sales = [sale for sale in sales if sale.fingerprint not in imported]
+        SalesRecord.objects.bulk_create(sales, batch_size=self.batch_size, ignore_conflicts=True)
+        return {sale.fingerprint for sale in sales}
+
+
+class CopySalesImporter(SalesImporter):
+    """Sales importer that loads each chunk with Postgres COPY"""
+
+    def __init__(self, business, batch_size=None, progress=None):
+        # COPY amortises far larger chunks than INSERT batches
+        batch_size = batch_size or getattr(settings, 'IMPORT_COPY_BATCH_SIZE', 10000)
+        super().__init__(business, batch_size=batch_size, progress=progress)
+
+    def save_sales(self, sales):
+        return copy_sales(self.business, sales, timezone.now())
+
+    def save_raw_records(self, raw_records):
+        copy_raw_sales(self.business, raw_records, timezone.now())
@@ -0,0 +1,245 @@
+"""
+Background Import Jobs
+CSV uploads are stored as ImportJob rows and processed outside the request,
+either on an in-process thread pool or by the process_import_jobs command.
+A claim is a lease renewed after every chunk: a running job that stops
+renewing it for IMPORT_JOB_LEASE_SECONDS was abandoned by a crashed or
+restarted process and is queued again, up to IMPORT_JOB_MAX_ATTEMPTS claims.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importers import CSV_READ_ERRORS, CopySalesImporter, ProductImporter, SalesImporter
+from .models import ImportJob
+from .pgcopy import use_copy_backend
+
+logger = logging.getLogger(__name__)
+
+IMPORTERS = {
+    'products': ProductImporter,
+    'sales': SalesImporter,
+}
+
+COPY_IMPORTERS = {
+    'sales': CopySalesImporter,
+}
+
+# Kinds where re-uploading an identical file is a no-op; product uploads are
+# upserts that may deliberately restore edited values, so they always run
+DEDUPLICATED_KINDS = ('sales',)
+
+_executor = None
+
+
+def get_executor():
+    """Lazily create the process-wide pool used in 'thread' mode"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMPORT_JOB_WORKERS', 2),
+            thread_name_prefix='import-job',
+        )
+    return _executor
+
+
+def uses_thread_pool():
+    return getattr(settings, 'IMPORT_JOBS_MODE', 'thread') == 'thread'
+
+
+def lease_cutoff():
+    """Jobs whose lease was last renewed before this have been abandoned"""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'IMPORT_JOB_LEASE_SECONDS', 300))
+
+
+class LeaseLost(Exception):
+    """The job was reclaimed while this run still held it"""
+
+
+def get_importer(kind):
+    """Importer class for a job kind, preferring COPY when it is enabled"""
+    if use_copy_backend() and kind in COPY_IMPORTERS:
+        return COPY_IMPORTERS[kind]
+    return IMPORTERS[kind]
+
+
+def file_digest(file):
+    """SHA-256 of an uploaded file's bytes, read without parsing the CSV"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def find_identical_import(business, kind, digest):
+    """
+    The latest job that imported (or is importing) the same file, if any.
+    Jobs left pending or running past the lease don't count, so a file whose
+    job died can be uploaded again; fingerprints keep a late run from
+    importing its rows twice.
+    """
+    cutoff = lease_cutoff()
+    return (
+        ImportJob.objects.filter(business=business, kind=kind, file_digest=digest)
+        .exclude(status='failed')
+        .exclude(status='pending', created_at__lt=cutoff)
+        .exclude(status='running', heartbeat_at__lt=cutoff)
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def enqueue_import(business, kind, file, user=None):
+    """
+    Store the upload as a pending job and hand it to the configured runner.
+    Returns (job, created); created is False when an identical file was
+    already imported and the existing job is returned instead.
+    """
+    digest = file_digest(file)
+    if kind in DEDUPLICATED_KINDS:
+        existing = find_identical_import(business, kind, digest)
+        if existing is not None:
+            return existing, False
+
+    job = ImportJob.objects.create(
+        business=business,
+        kind=kind,
+        file=file,
+        file_digest=digest,
+        created_by_id=user.id if user else None,
+    )
+
+    if uses_thread_pool():
+        transaction.on_commit(lambda: get_executor().submit(run_job_in_thread, job.id))
+
+    return job, True
+
+
+def claim_job(job_id):
+    """Atomically move a pending job to running; False if someone else got it"""
+    now = timezone.now()
+    return bool(
+        ImportJob.objects.filter(id=job_id, status='pending').update(
+            status='running', started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+        )
+    )
+
+
+def reclaim_stale_jobs():
+    """
+    Queue running jobs whose lease has expired again, or fail them once they
+    have used IMPORT_JOB_MAX_ATTEMPTS claims. Returns (requeued, failed).
+    """
+    stale = ImportJob.objects.filter(
+        Q(heartbeat_at__lt=lease_cutoff()) | Q(heartbeat_at__isnull=True), status='running'
+    )
+    max_attempts = getattr(settings, 'IMPORT_JOB_MAX_ATTEMPTS', 3)
+
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed',
+        error_message=f'Abandoned after {max_attempts} attempts',
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status='pending', heartbeat_at=None)
+    if requeued or failed:
+        logger.warning('Reclaimed stale import jobs: %s requeued, %s failed', requeued, failed)
+    return requeued, failed
+
+
+def resume_jobs():
+    """
+    Thread mode: after a restart nothing holds the pending jobs of the
+    previous process, so reclaim stale runs and submit every pending job
+    """
+    close_old_connections()
+    try:
+        reclaim_stale_jobs()
+        pending = ImportJob.objects.filter(status='pending').order_by('created_at')
+        for job_id in pending.values_list('id', flat=True):
+            get_executor().submit(run_job_in_thread, job_id)
+    finally:
+        close_old_connections()
+
+
+def claim_next_job():
+    """Claim the oldest pending job, or return None when the queue is empty"""
+    pending = ImportJob.objects.filter(status='pending').order_by('created_at')
+    for job_id in pending.values_list('id', flat=True)[:10]:
+        if claim_job(job_id):
+            return ImportJob.objects.select_related('business').get(id=job_id)
+    return None
+
+
+def run_job_in_thread(job_id):
+    """Entry point for the thread pool; owns its own database connection"""
+    close_old_connections()
+    try:
+        if claim_job(job_id):
+            run_import_job(ImportJob.objects.select_related('business').get(id=job_id))
+    finally:
+        close_old_connections()
+
+
+def held(job):
+    """The job's row while this run still holds its claim; attempts is the fencing token"""
+    return ImportJob.objects.filter(id=job.id, status='running', attempts=job.attempts)
+
+
+def run_import_job(job):
+    """Run a claimed job to completion; every chunk records progress and renews the lease"""
+    def report(results):
+        errors = results.get('errors', 0)
+        renewed = held(job).update(
+            rows_processed=sum(results.values()),
+            rows_failed=errors,
+            summary=results,
+            heartbeat_at=timezone.now(),
+        )
+        if not renewed:
+            raise LeaseLost(f'Import job {job.id} was reclaimed')
+
+    importer = get_importer(job.kind)(job.business, progress=report)
+
+    try:
+        with job.file.open('rb') as file:
+            results = importer.import_csv(file)
+    except LeaseLost:
+        logger.warning('Import job %s lost its lease; stopping this run', job.id)
+        return job
+    except CSV_READ_ERRORS as exc:
+        job.status = 'failed'
+        job.error_message = f'Unable to read CSV file: {exc}'
+        job.summary = importer.results
+    except Exception as exc:
+        logger.exception('Import job %s failed', job.id)
+        job.status = 'failed'
+        job.error_message = str(exc)
+        job.summary = importer.results
+    else:
+        job.status = 'done'
+        job.summary = results
+
+    job.rows_processed = sum(job.summary.values())
+    job.rows_failed = job.summary.get('errors', 0)
+    job.finished_at = timezone.now()
+    saved = held(job).update(
+        status=job.status,
+        summary=job.summary,
+        error_message=job.error_message,
+        rows_processed=job.rows_processed,
+        rows_failed=job.rows_failed,
+        finished_at=job.finished_at,
+    )
+    if not saved:
+        logger.warning('Import job %s lost its lease; discarding its result', job.id)
+    elif job.status == 'done':
+        job.file.delete(save=False)
+        ImportJob.objects.filter(id=job.id).update(file='')
+    return job
@@ -0,0 +1,478 @@
+"""
+LLM Providers
+Campaign copy is produced through a provider object so the generator does not
+depend on a particular vendor. HTTP providers share one keep-alive connection
+pool per process and apply hard timeouts, retries with jittered backoff and a
+concurrency cap; responses are cached by prompt hash and can be streamed as
+they are generated. FakeProvider runs locally and is what tests and
+development use.
+"""
+import hashlib
+import http.client
+import json
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A completion could not be obtained from the provider"""
+
+
+class FakeProvider:
+    """Deterministic stand-in for an LLM: echoes the prompt after an optional delay"""
+    name = 'fake'
+
+    def __init__(self, latency=None):
+        if latency is None:
+            latency = getattr(settings, 'FAKE_LLM_LATENCY', 0)
+        self.latency = latency
+
+    def complete(self, prompt, timeout=None):
+        if timeout is not None and self.latency > timeout:
+            time.sleep(max(timeout, 0))
+            raise LLMError(f'fake request timed out after {timeout}s')
+        if self.latency:
+            time.sleep(self.latency)
+        return prompt
+
+    def stream(self, prompt):
+        """Yield the prompt word by word, spreading the latency across the words"""
+        tokens = re.findall(r'\S+\s*|\s+', prompt)
+        delay = self.latency / len(tokens) if self.latency and tokens else 0
+        for token in tokens:
+            if delay:
+                time.sleep(delay)
+            yield token
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections to one host"""
+
+    def __init__(self, base_url, size, timeout):
+        parts = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def set_timeout(self, connection, timeout):
+        """Bound the next connect, send or receive on the connection"""
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+
+    def open(self, method, path, body, headers, timeout=None):
+        """
+        Send one request and return (connection, response) with the body still
+        unread; pass both to finish() once the body has been consumed.
+        """
+        connection = self._acquire()
+        try:
+            self.set_timeout(connection, self.timeout if timeout is None else timeout)
+            connection.request(method, self.base_path + path, body=body, headers=headers)
+            return connection, connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+
+    def finish(self, connection, response, reuse=True):
+        """Return the connection to the pool, or close it if it cannot be reused"""
+        if reuse and not response.will_close and response.isclosed():
+            self._release(connection)
+        else:
+            # The socket may be half-used; never hand it out again
+            connection.close()
+
+    def request(self, method, path, body, headers):
+        """Send one request and return (status, headers, body bytes)"""
+        connection, response = self.open(method, path, body, headers)
+        try:
+            data = response.read()
+        except Exception:
+            self.finish(connection, response, reuse=False)
+            raise
+        self.finish(connection, response)
+        return response.status, response.headers, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class HTTPProvider:
+    """
+    Base class for JSON-over-HTTP completion APIs. Subclasses describe the
+    request path, headers and payload, and how to read the text back.
+    """
+    name = None
+    path = None
+    default_url = None
+
+    def __init__(self, base_url=None, api_key=None, model=None, timeout=None,
+                 max_retries=None, max_concurrency=None, pool_size=None):
+        self.base_url = base_url or getattr(settings, 'LLM_API_URL', None) or self.default_url
+        self.api_key = api_key or getattr(settings, 'LLM_API_KEY', '')
+        self.model = model or getattr(settings, 'LLM_MODEL', '')
+        self.timeout = timeout or getattr(settings, 'LLM_TIMEOUT', 30)
+        self.max_retries = (
+            getattr(settings, 'LLM_MAX_RETRIES', 2) if max_retries is None else max_retries
+        )
+        max_concurrency = max_concurrency or getattr(settings, 'LLM_MAX_CONCURRENCY', 4)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.pool = ConnectionPool(
+            self.base_url,
+            size=pool_size or getattr(settings, 'LLM_POOL_SIZE', max_concurrency),
+            timeout=self.timeout,
+        )
+
+    def headers(self):
+        return {'Content-Type': 'application/json'}
+
+    def payload(self, prompt):
+        raise NotImplementedError
+
+    def parse(self, data):
+        raise NotImplementedError
+
+    def parse_event(self, event):
+        """Text carried by one server-sent event of a streamed completion, or None"""
+        raise NotImplementedError
+
+    def complete(self, prompt, timeout=None):
+        """
+        Return the completion, retrying transient failures. LLM_TIMEOUT, or
+        timeout when the caller has less time left, is one deadline for the
+        whole call: waiting for a slot, every attempt and backoff, and reading
+        the body all draw on it.
+        """
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        body = json.dumps(self.payload(prompt))
+
+        if not self._slots.acquire(timeout=self._remaining(deadline)):
+            raise LLMError('Timed out waiting for a free LLM request slot')
+        try:
+            connection, response = self._send(body, deadline)
+            try:
+                data = self._read(connection, response, deadline)
+            except (OSError, http.client.HTTPException) as exc:
+                self.pool.finish(connection, response, reuse=False)
+                raise LLMError(f'{self.name} response failed: {exc}')
+            except LLMError:
+                self.pool.finish(connection, response, reuse=False)
+                raise
+            self.pool.finish(connection, response)
+            return self.parse(json.loads(data))
+        finally:
+            self._slots.release()
+
+    def stream(self, prompt):
+        """
+        Yield the completion as it is generated. Only opening the request is
+        retried; once text has been yielded a failure is raised as LLMError.
+        LLM_TIMEOUT bounds everything up to the response headers, then limits
+        how long the stream may go quiet between reads.
+        """
+        deadline = time.monotonic() + self.timeout
+        body = json.dumps({**self.payload(prompt), 'stream': True})
+
+        if not self._slots.acquire(timeout=self._remaining(deadline)):
+            raise LLMError('Timed out waiting for a free LLM request slot')
+        try:
+            connection, response = self._send(body, deadline)
+            self.pool.set_timeout(connection, self.timeout)
+            finished = False
+            try:
+                for event in self._events(response):
+                    if event == '[DONE]':
+                        break
+                    text = self.parse_event(json.loads(event))
+                    if text:
+                        yield text
+                finished = True
+            except (OSError, http.client.HTTPException, ValueError) as exc:
+                raise LLMError(f'{self.name} stream failed: {exc}')
+            finally:
+                if finished:
+                    # Drain anything after the terminating event
+                    response.read()
+                self.pool.finish(connection, response, reuse=finished)
+        finally:
+            self._slots.release()
+
+    def _remaining(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError(f'{self.name} request timed out')
+        return remaining
+
+    def _read(self, connection, response, deadline):
+        """Read the whole body, giving up once the deadline passes"""
+        chunks = []
+        while True:
+            self.pool.set_timeout(connection, self._remaining(deadline))
+            # read1 returns after a single receive, so a trickling body can't
+            # hold the read open past the deadline
+            chunk = response.read1(64 * 1024)
+            if not chunk:
+                # read() notices the body is complete so the connection can be reused
+                chunks.append(response.read())
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def _send(self, body, deadline):
+        """Open a successful response, retrying transient failures until the deadline"""
+        for attempt in range(self.max_retries + 1):
+            delay = None
+            try:
+                connection, response = self.pool.open(
+                    'POST', self.path, body, self.headers(), timeout=self._remaining(deadline)
+                )
+            except (OSError, http.client.HTTPException) as exc:
+                error = LLMError(f'{self.name} request failed: {exc}')
+            else:
+                if response.status == 200:
+                    return connection, response
+                try:
+                    data = self._read(connection, response, deadline)
+                except (OSError, http.client.HTTPException, LLMError):
+                    data = b''
+                self.pool.finish(connection, response)
+                error = LLMError(f'{self.name} returned HTTP {response.status}: {data[:200]!r}')
+                if response.status not in RETRY_STATUSES:
+                    raise error
+                delay = self._retry_after(response.headers)
+
+            if delay is None:
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, 0.5 * 2 ** attempt)
+            if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                raise error
+            time.sleep(delay)
+
+    def _events(self, response):
+        """Yield the data of each server-sent event in the response body"""
+        data = []
+        for line in response:
+            line = line.decode().rstrip('\r\n')
+            if line.startswith('data:'):
+                data.append(line[5:].lstrip(' '))
+            elif not line and data:
+                yield '\n'.join(data)
+                data = []
+        if data:
+            yield '\n'.join(data)
+
+    def _retry_after(self, headers):
+        try:
+            return float(headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+
+class OpenAIProvider(HTTPProvider):
+    """OpenAI-compatible chat completions endpoint"""
+    name = 'openai'
+    path = '/v1/chat/completions'
+    default_url = 'https://api.openai.com'
+
+    def headers(self):
+        return {**super().headers(), 'Authorization': f'Bearer {self.api_key}'}
+
+    def payload(self, prompt):
+        return {'model': self.model, 'messages': [{'role': 'user', 'content': prompt}]}
+
+    def parse(self, data):
+        try:
+            return data['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            raise LLMError('Unexpected openai response shape')
+
+    def parse_event(self, event):
+        try:
+            return event['choices'][0]['delta'].get('content')
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return None
+
+
+class AnthropicProvider(HTTPProvider):
+    """Anthropic Messages API"""
+    name = 'anthropic'
+    path = '/v1/messages'
+    default_url = 'https://api.anthropic.com'
+
+    def headers(self):
+        return {
+            **super().headers(),
+            'x-api-key': self.api_key,
+            'anthropic-version': '2023-06-01',
+        }
+
+    def payload(self, prompt):
+        return {
+            'model': self.model,
+            'max_tokens': getattr(settings, 'LLM_MAX_TOKENS', 1024),
+            'messages': [{'role': 'user', 'content': prompt}],
+        }
+
+    def parse(self, data):
+        try:
+            return ''.join(block['text'] for block in data['content'] if block['type'] == 'text')
+        except (KeyError, TypeError):
+            raise LLMError('Unexpected anthropic response shape')
+
+    def parse_event(self, event):
+        if event.get('type') == 'error':
+            raise LLMError(f"anthropic stream error: {event.get('error')}")
+        if event.get('type') == 'content_block_delta':
+            return event['delta'].get('text')
+        return None
+
+
+class ResponseCache:
+    """Thread-safe LRU of prompt hash -> completion with a TTL"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class CachedProvider:
+    """
+    Wraps a provider so identical prompts are only paid for once. Campaign
+    prompts embed the business's analysis, goal and budget, so a data version
+    bump that changes the analysis also changes the key.
+    """
+
+    def __init__(self, provider, maxsize, ttl):
+        self.provider = provider
+        self.cache = ResponseCache(maxsize, ttl)
+
+    @property
+    def name(self):
+        return self.provider.name
+
+    def cache_key(self, prompt):
+        model = getattr(self.provider, 'model', '')
+        return hashlib.sha256(f'{self.provider.name}|{model}|{prompt}'.encode()).hexdigest()
+
+    def complete(self, prompt, timeout=None):
+        key = self.cache_key(prompt)
+        completion = self.cache.get(key)
+        if completion is None:
+            completion = self.provider.complete(prompt, timeout=timeout)
+            self.cache.set(key, completion)
+        return completion
+
+    def stream(self, prompt):
+        """Replay a cached completion in one piece, or stream and cache it once complete"""
+        key = self.cache_key(prompt)
+        completion = self.cache.get(key)
+        if completion is not None:
+            yield completion
+            return
+        chunks = []
+        for chunk in self.provider.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.set(key, ''.join(chunks))
+
+
+PROVIDERS = {
+    'fake': FakeProvider,
+    'openai': OpenAIProvider,
+    'anthropic': AnthropicProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def build_provider():
+    name = getattr(settings, 'CAMPAIGN_LLM_PROVIDER', 'fake')
+    if name not in PROVIDERS:
+        raise ImproperlyConfigured(f"Unknown CAMPAIGN_LLM_PROVIDER '{name}'")
+
+    provider = PROVIDERS[name]()
+    cache_size = getattr(settings, 'LLM_CACHE_SIZE', 256)
+    if cache_size:
+        provider = CachedProvider(
+            provider, maxsize=cache_size, ttl=getattr(settings, 'LLM_CACHE_TTL', 3600)
+        )
+    return provider
+
+
+def get_provider():
+    """The process-wide provider named by CAMPAIGN_LLM_PROVIDER, so its pool is reused"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider()
+    return _provider
+
+
+@receiver(setting_changed)
+def reset_provider(setting, **kwargs):
+    """Rebuild the provider when tests override LLM settings"""
+    global _provider
+    if setting.startswith(('LLM_', 'CAMPAIGN_LLM_', 'FAKE_LLM_')):
+        with _provider_lock:
+            old, _provider = _provider, None
+        pool = getattr(getattr(old, 'provider', old), 'pool', None)
+        if pool is not None:
+            pool.close()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from business_data.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Run a synthetic performance benchmark and print the timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS))
+        parser.add_argument(
+            '--rows',
+            type=int,
+            help='Number of synthetic rows to generate (100000, or 1000000 for copy)',
+        )
+
+    def handle(self, *args, **options):
+        bench_options = {}
+        if options['rows'] is not None:
+            bench_options['rows'] = options['rows']
+        report = BENCHMARKS[options['name']](**bench_options)
+
+        for line in report:
+            self.stdout.write(
+                ', '.join(f'{key}={value}' for key, value in line.items())
+            )
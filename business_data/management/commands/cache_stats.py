@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from business_data.access import access_cache_stats
+from business_data.cache import analysis_cache_stats
+
+CACHE_STATS = {
+    'analysis': analysis_cache_stats,
+    'business access': access_cache_stats,
+}
+
+
+class Command(BaseCommand):
+    help = 'Show hit and miss counts for the shared caches'
+
+    def handle(self, *args, **options):
+        for name, stats in CACHE_STATS.items():
+            totals = stats()
+            self.stdout.write(
+                f"{name}: {totals['hits']} hits, {totals['misses']} misses, "
+                f"hit rate {totals['hit_rate']}"
+            )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from business_data.queryplans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = 'Verify that the hot business-scoped queries are served by an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full plan of every query, not only failing ones',
+        )
+
+    def handle(self, *args, **options):
+        failures = 0
+
+        for query, indexes, problem, plan in check_query_plans():
+            if problem is None:
+                self.stdout.write(
+                    self.style.SUCCESS(f"ok    {query.name} ({', '.join(indexes)})")
+                )
+            else:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'FAIL  {query.name}: {problem}'))
+
+            if problem is not None or options['verbose_plans']:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{failures} hot queries are not index-backed on {connection.vendor}')
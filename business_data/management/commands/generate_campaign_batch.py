@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from business_data.campaigns import generate_batch
+from users.models import Business
+
+
+class Command(BaseCommand):
+    help = 'Generate one campaign per business, sharing one analysis pass per chunk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('businesses', nargs='*', help='Slugs of the businesses to generate for')
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Generate for every business instead of the listed slugs',
+        )
+        parser.add_argument('--goal', default='Increase sales', help='Campaign goal')
+        parser.add_argument('--budget', type=float, default=50000, help='Campaign budget in KSh')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Businesses analysed and inserted together',
+        )
+
+    def handle(self, *args, **options):
+        if options['all'] == bool(options['businesses']):
+            raise CommandError('Pass business slugs or --all, not both')
+
+        businesses = Business.objects.order_by('id')
+        if not options['all']:
+            slugs = list(dict.fromkeys(options['businesses']))
+            businesses = businesses.filter(slug__in=slugs)
+            missing = set(slugs) - set(businesses.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f"Unknown businesses: {', '.join(sorted(missing))}")
+
+        campaigns = generate_batch(
+            businesses.iterator(),
+            goal=options['goal'],
+            budget=options['budget'],
+            chunk_size=options['chunk_size'],
+        )
+
+        failed = [campaign for campaign in campaigns if campaign.status == 'failed']
+        for campaign in failed:
+            self.stdout.write(f'{campaign.business.slug}: failed: {campaign.error_message}')
+        self.stdout.write(f'{len(campaigns)} campaigns generated, {len(failed)} failed')
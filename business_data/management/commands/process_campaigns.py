@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from business_data.campaigns import claim_next_campaign, reclaim_stale_campaigns, run_campaign
+
+
+class Command(BaseCommand):
+    help = 'Generate pending campaigns from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep between polls when the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # Runs abandoned by a crashed or restarted worker go back in the queue
+            reclaim_stale_campaigns()
+            campaign = claim_next_campaign()
+
+            if campaign is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f'Generating campaign {campaign.id} for {campaign.business.name}')
+            campaign = run_campaign(campaign)
+            self.stdout.write(f'Campaign {campaign.id} {campaign.status}')
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from business_data.jobs import claim_next_job, reclaim_stale_jobs, run_import_job
+from business_data.retention import prune_raw_records
+
+
+class Command(BaseCommand):
+    help = 'Consume pending CSV import jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep between polls when the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        retention_interval = getattr(settings, 'RAW_RECORD_RETENTION_INTERVAL', 0)
+        next_retention = time.monotonic()
+
+        while True:
+            # Jobs abandoned by a crashed or restarted worker go back in the queue
+            reclaim_stale_jobs()
+            job = claim_next_job()
+
+            if job is None:
+                if options['once']:
+                    return
+                if retention_interval and time.monotonic() >= next_retention:
+                    self.prune_raw_records()
+                    next_retention = time.monotonic() + retention_interval
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f'Processing {job.kind} import job {job.id}')
+            job = run_import_job(job)
+            self.stdout.write(
+                f'Job {job.id} {job.status}: {job.rows_processed} rows, '
+                f'{job.rows_failed} errors, {job.throughput} rows/s'
+            )
+
+    def prune_raw_records(self):
+        # Bounded so a large backlog never keeps queued imports waiting for long
+        summary = prune_raw_records(max_batches=10)
+        removed = sum(totals['rows'] for totals in summary.values())
+        if removed:
+            self.stdout.write(f'Pruned {removed} expired raw upload rows')
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from business_data.retention import RETAINED_MODELS, prune_raw_records
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete cleaned raw upload rows older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Keep cleaned raw rows newer than this many days (RAW_RECORD_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Rows archived and deleted per transaction',
+        )
+        parser.add_argument(
+            '--kind',
+            choices=sorted(RETAINED_MODELS),
+            action='append',
+            help='Limit pruning to products or sales; may be repeated',
+        )
+        archive = parser.add_mutually_exclusive_group()
+        archive.add_argument(
+            '--archive',
+            action='store_true',
+            default=None,
+            help='Write rows to gzipped NDJSON before deleting them',
+        )
+        archive.add_argument(
+            '--no-archive',
+            action='store_false',
+            dest='archive',
+            default=None,
+            help='Delete rows without archiving them',
+        )
+
+    def handle(self, *args, **options):
+        summary = prune_raw_records(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            archive=options['archive'],
+            kinds=options['kind'],
+        )
+
+        for kind, totals in summary.items():
+            self.stdout.write(
+                f"{kind}: removed {totals['rows']} rows, "
+                f"~{totals['bytes_reclaimed']} bytes reclaimed, "
+                f"{totals['archive_bytes']} bytes archived"
+            )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from business_data.rollups import rebuild_rollup
+from users.models import Business
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyProductSales rollup from SalesRecord rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--business',
+            help='Slug of a single business to rebuild; defaults to all businesses',
+        )
+
+    def handle(self, *args, **options):
+        business = None
+        if options['business']:
+            business = Business.objects.filter(slug=options['business']).first()
+            if business is None:
+                raise CommandError(f"Business '{options['business']}' does not exist")
+
+        created = rebuild_rollup(business)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily rollup rows'))
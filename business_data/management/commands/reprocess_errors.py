@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from business_data.reprocessing import REPROCESSORS, reprocess_errors
+from users.models import Business
+
+
+class Command(BaseCommand):
+    help = 'Re-run cleaning over raw upload rows that previously failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('business', help='Slug of the business whose error rows to reprocess')
+        parser.add_argument(
+            '--kind',
+            choices=sorted(REPROCESSORS),
+            action='append',
+            help='Limit reprocessing to products or sales; may be repeated',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Rows claimed and imported per batch',
+        )
+
+    def handle(self, *args, **options):
+        business = Business.objects.filter(slug=options['business']).first()
+        if business is None:
+            raise CommandError(f"Business '{options['business']}' does not exist")
+
+        for kind in options['kind'] or REPROCESSORS:
+            results, _ = reprocess_errors(kind, business, batch_size=options['batch_size'])
+            self.stdout.write(
+                f'{kind}: ' + ', '.join(f'{key}={value}' for key, value in results.items())
+            )
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollup(apps, schema_editor):
+    SalesRecord = apps.get_model('business_data', 'SalesRecord')
+    DailyProductSales = apps.get_model('business_data', 'DailyProductSales')
+
+    grouped = (
+        SalesRecord.objects.values('business_id', 'product_id', 'date', 'channel')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'), total=Count('id'))
+        .order_by()
+    )
+    DailyProductSales.objects.bulk_create(
+        (
+            DailyProductSales(
+                business_id=row['business_id'],
+                product_id=row['product_id'],
+                date=row['date'],
+                channel=row['channel'],
+                quantity=row['total_quantity'],
+                revenue=row['total_revenue'],
+                records=row['total'],
+            )
+            for row in grouped.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0003_importjob'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('channel', models.CharField(default='offline', max_length=50)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('records', models.IntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='users.business')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='business_data.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business', 'product', 'date', 'channel'), name='unique_daily_product_sales')],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
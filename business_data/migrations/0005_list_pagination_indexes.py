@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0004_dailyproductsales'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['business', 'id'], name='product_business_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesrecord',
+            index=models.Index(fields=['business', 'date', 'id'], name='sales_business_date_id_idx'),
+        ),
+    ]
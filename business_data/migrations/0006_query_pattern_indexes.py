@@ -0,0 +1,78 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_products(apps, schema_editor):
+    """Fold same-named products into the oldest one so the constraint can apply"""
+    Product = apps.get_model('business_data', 'Product')
+    SalesRecord = apps.get_model('business_data', 'SalesRecord')
+    DailyProductSales = apps.get_model('business_data', 'DailyProductSales')
+
+    duplicates = (
+        Product.objects.values('business_id', 'name')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in duplicates.iterator():
+        keep_id = group['keep_id']
+        extra_ids = list(
+            Product.objects.filter(business_id=group['business_id'], name=group['name'])
+            .exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+
+        SalesRecord.objects.filter(product_id__in=extra_ids).update(product_id=keep_id)
+
+        kept = {
+            (row.date, row.channel): row
+            for row in DailyProductSales.objects.filter(product_id=keep_id)
+        }
+        for row in DailyProductSales.objects.filter(product_id__in=extra_ids):
+            target = kept.get((row.date, row.channel))
+            if target is None:
+                row.product_id = keep_id
+                row.save(update_fields=['product_id'])
+                kept[(row.date, row.channel)] = row
+                continue
+            target.quantity += row.quantity
+            target.revenue += row.revenue
+            target.records += row.records
+            target.save(update_fields=['quantity', 'revenue', 'records'])
+            row.delete()
+
+        Product.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0005_list_pagination_indexes'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['business', '-created_at'], name='campaign_business_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='importjob',
+            index=models.Index(fields=['status', 'created_at'], name='importjob_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawproductrecord',
+            index=models.Index(fields=['business', 'status'], name='rawproduct_business_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawsalesrecord',
+            index=models.Index(fields=['business', 'status'], name='rawsales_business_status_idx'),
+        ),
+        # Run last and keep the constraint in its own migration: Postgres will not
+        # ALTER a table with pending deferred FK checks from this data step
+        migrations.RunPython(merge_duplicate_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0006_query_pattern_indexes'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('business', 'name'), name='unique_product_name'),
+        ),
+    ]
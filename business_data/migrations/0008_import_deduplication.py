@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0007_unique_product_name'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='file_digest',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='salesrecord',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='importjob',
+            index=models.Index(fields=['business', 'kind', 'file_digest'], name='importjob_digest_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrecord',
+            constraint=models.UniqueConstraint(fields=('business', 'fingerprint'), name='unique_sales_fingerprint'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0009_campaign_generation_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
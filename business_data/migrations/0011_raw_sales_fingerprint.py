@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0010_campaign_attempts'),
+        ('users', '0002_user_tokens_valid_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rawsalesrecord',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='rawsalesrecord',
+            index=models.Index(fields=['business', 'fingerprint'], name='rawsales_fingerprint_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_data', '0011_raw_sales_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rawproductrecord',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rawsalesrecord',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
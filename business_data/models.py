@@ -1,5 +1,6 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from users.models import Business
 
 
@@ -15,8 +16,15 @@ class RawProductRecord(models.Model):
     raw_row = models.JSONField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='raw')
     error_message = models.TextField(blank=True, null=True)
+    # When reprocessing moved the row to 'cleaning'; stale claims are taken over
+    claimed_at = models.DateTimeField(blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'status'], name='rawproduct_business_status_idx'),
+        ]
+
     def __str__(self):
         return f"Raw Product Record for {self.business.name} - {self.status}"
 
@@ -26,11 +34,21 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     sku = models.CharField(max_length=1000, blank=True, null=True)
     category = models.CharField(max_length=100, blank=True, null=True)
+    description = models.TextField(blank=True, null=True)
     price = models.FloatField(default=0)
     cost_price = models.FloatField(default=0)
     attributes = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'id'], name='product_business_id_idx'),
+        ]
+        constraints = [
+            # Also serves the (business, name) lookups made by the importers
+            models.UniqueConstraint(fields=['business', 'name'], name='unique_product_name'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.business.name}"
 
@@ -47,12 +65,31 @@ class RawSalesRecord(models.Model):
     raw_row = models.JSONField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='raw')
     error_message = models.TextField(blank=True, null=True)
+    # Hash of the uploaded row for rows stored as errors, so re-uploads skip them
+    fingerprint = models.CharField(max_length=64, blank=True, null=True)
+    # When reprocessing moved the row to 'cleaning'; stale claims are taken over
+    claimed_at = models.DateTimeField(blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'status'], name='rawsales_business_status_idx'),
+            models.Index(fields=['business', 'fingerprint'], name='rawsales_fingerprint_idx'),
+        ]
+
     def __str__(self):
         return f"Raw Sales Record for {self.business.name} - {self.status}"
 
 
+class SalesRecordQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the rows and update the sales rollup once for all of them"""
+        from .rollups import deferred_deltas
+
+        with transaction.atomic(using=self.db), deferred_deltas():
+            return super().delete()
+
+
 class SalesRecord(models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='sales')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -60,17 +97,40 @@ class SalesRecord(models.Model):
     quantity = models.IntegerField()
     revenue = models.FloatField()
     channel = models.CharField(max_length=50, default='offline')
+    # Hash of the normalised CSV row for imported sales; None for manual entries
+    fingerprint = models.CharField(max_length=64, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = SalesRecordQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'date', 'id'], name='sales_business_date_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['business', 'fingerprint'], name='unique_sales_fingerprint'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.product.name} ({self.quantity} pcs)"
 
 
 class Campaign(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='campaigns')
     goal = models.CharField(max_length=255)
     budget = models.FloatField()
-    payload = models.JSONField()
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error_message = models.TextField(blank=True, null=True)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -79,9 +139,94 @@ class Campaign(models.Model):
         related_name='generated_campaigns',
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Times the campaign was claimed; bounds retries of abandoned runs
+    attempts = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['business', '-created_at'], name='campaign_business_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='campaign_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Campaign for {self.business.name} ({self.goal})"
+
+
+class ImportJob(models.Model):
+    KIND_CHOICES = (
+        ('products', 'Products'),
+        ('sales', 'Sales'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='import_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='imports/%Y/%m/', blank=True)
+    file_digest = models.CharField(max_length=64, blank=True, default='')
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    summary = models.JSONField(default=dict, blank=True)
+    error_message = models.TextField(blank=True, null=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='import_jobs',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # Renewed after every chunk; a running job that stops renewing it is abandoned
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='importjob_status_created_idx'),
+            models.Index(fields=['business', 'kind', 'file_digest'], name='importjob_digest_idx'),
+        ]
+
+    @property
+    def throughput(self):
+        """Rows processed per second since the job started"""
+        if not self.started_at:
+            return 0
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 2) if elapsed > 0 else 0
+
+    def __str__(self):
+        return f"{self.get_kind_display()} import for {self.business.name} - {self.status}"
+
+
+class DailyProductSales(models.Model):
+    """Per-day sales totals maintained incrementally from SalesRecord writes"""
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='daily_sales')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    channel = models.CharField(max_length=50, default='offline')
+    quantity = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    records = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['business', 'product', 'date', 'channel'],
+                name='unique_daily_product_sales',
+            ),
+        ]
 
     def __str__(self):
-        return f"Campaign for {self.business.name} ({self.goal})"
\ No newline at end of file
+        return f"{self.product.name} on {self.date} ({self.channel}): {self.quantity} pcs"
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Keyset Pagination
+Pages are addressed by the ordering key of the last row served rather than an
+offset, so page N costs the same index range scan as page 1
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a unique, stable ordering such as ('-date', '-id')"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+        self.page_size = getattr(settings, 'LIST_PAGE_SIZE', 100)
+        self.max_page_size = getattr(settings, 'LIST_MAX_PAGE_SIZE', 1000)
+        self.next_cursor = None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, position):
+        payload = json.dumps(position, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            fields = [f.lstrip('-') for f in self.ordering]
+            if len(position) != len(fields):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(name).to_python(value)
+                for name, value in zip(fields, position)
+            ]
+        except Exception:
+            raise NotFound('Invalid cursor')
+
+    def keyset_filter(self, position):
+        """Rows strictly after position, e.g. date < d OR (date = d AND id < i)"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(self.decode_cursor(queryset, cursor)))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(
+                [self._value(rows[-1], field.lstrip('-')) for field in self.ordering]
+            )
+        return rows
+
+    def _value(self, row, name):
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
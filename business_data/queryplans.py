@@ -0,0 +1,99 @@
+"""
+Query Plan Checks
+EXPLAINs the hot business-scoped queries and verifies that each one is served
+by an index rather than a table scan, on SQLite and on Postgres.
+Run through `python manage.py check_query_plans`.
+"""
+import datetime
+import re
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+
+from .models import Campaign, ImportJob, Product, RawProductRecord, RawSalesRecord, SalesRecord
+
+# SQLite: "SEARCH t USING INDEX name (...)"; Postgres: "Index Scan using name on t"
+INDEX_USED = re.compile(
+    r'USING (?:COVERING )?INDEX (\S+)'
+    r'|Index (?:Only )?Scan(?: Backward)? using (\S+)'
+    r'|Bitmap Index Scan on (\S+)'
+)
+SORT_STEP = re.compile(r'TEMP B-TREE FOR ORDER BY|\bSort\b')
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    name: str
+    build: object
+    # True when the ORDER BY should be satisfied by the index without a sort step
+    ordered: bool = False
+
+
+def _sales_page(business_id):
+    since = datetime.date(2025, 1, 1)
+    return SalesRecord.objects.filter(business_id=business_id, date__gte=since).order_by(
+        '-date', '-id'
+    )
+
+
+HOT_QUERIES = (
+    HotQuery(
+        'product by name',
+        lambda business_id: Product.objects.filter(business_id=business_id, name='x'),
+    ),
+    HotQuery(
+        'product list page',
+        lambda business_id: Product.objects.filter(business_id=business_id).order_by('id'),
+        ordered=True,
+    ),
+    HotQuery('sales list page', _sales_page, ordered=True),
+    HotQuery(
+        'raw product errors',
+        lambda business_id: RawProductRecord.objects.filter(
+            business_id=business_id, status='error'
+        ),
+    ),
+    HotQuery(
+        'raw sales errors',
+        lambda business_id: RawSalesRecord.objects.filter(
+            business_id=business_id, status='error'
+        ),
+    ),
+    HotQuery(
+        'campaign history',
+        lambda business_id: Campaign.objects.filter(business_id=business_id),
+        ordered=True,
+    ),
+    HotQuery(
+        'import job queue',
+        lambda business_id: ImportJob.objects.filter(status='pending').order_by('created_at'),
+        ordered=True,
+    ),
+)
+
+
+def explain(queryset):
+    """Return the plan text; Postgres is told to avoid sequential scans so that
+    small development tables still show which index the planner would use"""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def used_indexes(plan):
+    return [next(name for name in match if name) for match in INDEX_USED.findall(plan)]
+
+
+def check_query_plans(business_id=0):
+    """Yield (query, indexes, problem, plan) for every hot query"""
+    for query in HOT_QUERIES:
+        plan = explain(query.build(business_id))
+        indexes = used_indexes(plan)
+        problem = None
+        if not indexes:
+            problem = 'scans the table instead of using an index'
+        elif query.ordered and SORT_STEP.search(plan):
+            problem = 'sorts rows instead of reading the index in order'
+        yield query, indexes, problem, plan
@@ -0,0 +1,147 @@
+"""
+Error Row Reprocessing
+Re-runs the import cleaning rules over raw rows stored with status 'error',
+optionally after applying per-row corrections. Rows are claimed in batches by
+moving them to 'cleaning', so several workers can drain one backlog without
+processing a row twice; each row ends up 'cleaned' or back in 'error' with
+a fresh message. A claim older than REPROCESS_CLAIM_SECONDS belongs to a
+worker that died mid-batch, and its rows can be claimed again.
+"""
+from datetime import timedelta
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .importers import ProductImporter, SalesImporter
+
+
+class Reprocessing:
+    """Importer mixin that writes results onto the claimed raw rows instead of adding new ones"""
+
+    def raw_record(self, index, raw_data, error_message=None):
+        record = super().raw_record(index, raw_data, error_message)
+        # Frames are indexed by raw record id
+        record.pk = index
+        return record
+
+    def find_stored_errors(self, fingerprints):
+        # The claimed rows are the stored errors, and failures must be written back
+        return set()
+
+    def save_raw_records(self, raw_records):
+        self.raw_model.objects.bulk_update(
+            raw_records, ['status', 'error_message'], batch_size=self.batch_size
+        )
+
+
+class ProductReprocessor(Reprocessing, ProductImporter):
+    pass
+
+
+class SalesReprocessor(Reprocessing, SalesImporter):
+    pass
+
+
+REPROCESSORS = {
+    'products': ProductReprocessor,
+    'sales': SalesReprocessor,
+}
+
+
+def error_rows(kind, business):
+    return REPROCESSORS[kind].raw_model.objects.filter(business=business, status='error')
+
+
+def claimable(now=None):
+    """Error rows, and rows left in 'cleaning' by a claim that has expired"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'REPROCESS_CLAIM_SECONDS', 600))
+    return Q(status='error') | Q(status='cleaning', claimed_at__lt=cutoff)
+
+
+def claim_error_rows(kind, business, batch_size, ids=None, after_id=0):
+    """Move up to batch_size error rows past after_id to 'cleaning'; returns their (id, raw_row)"""
+    model = REPROCESSORS[kind].raw_model
+    now = timezone.now()
+    errors = model.objects.filter(claimable(now), business=business, id__gt=after_id).order_by('id')
+    if ids is not None:
+        errors = errors.filter(id__in=ids)
+
+    with transaction.atomic():
+        # Workers skip rows another worker has locked but not yet moved
+        claimed = list(
+            errors.select_for_update(skip_locked=True).values_list('id', 'raw_row')[:batch_size]
+        )
+        model.objects.filter(claimable(now), id__in=[pk for pk, _ in claimed]).update(
+            status='cleaning', claimed_at=now
+        )
+    return claimed
+
+
+def process_claimed(reprocessor, claimed, corrections):
+    """Apply corrections to claimed rows and import them; unclaims them on failure"""
+    model = reprocessor.raw_model
+    ids = [pk for pk, _ in claimed]
+
+    try:
+        rows = []
+        corrected = []
+        for pk, raw_row in claimed:
+            if pk in corrections:
+                raw_row = {**raw_row, **corrections[pk]}
+                corrected.append(model(pk=pk, raw_row=raw_row))
+            rows.append(raw_row)
+
+        if corrected:
+            model.objects.bulk_update(corrected, ['raw_row'])
+
+        reprocessor.import_frame(pd.DataFrame.from_records(rows, index=ids))
+
+        # Sales rows skipped as already imported are not written back by the importer
+        model.objects.filter(id__in=ids, status='cleaning').update(
+            status='cleaned', error_message=None
+        )
+    except Exception:
+        model.objects.filter(id__in=ids, status='cleaning').update(status='error')
+        raise
+
+
+def reprocess_errors(
+    kind, business, corrections=None, ids=None, batch_size=None, max_batches=None, after_id=0
+):
+    """
+    Reprocess a business's error rows of one kind. corrections maps raw
+    record id -> {column: value}; when given without ids, only the corrected
+    rows are reprocessed.
+    Returns (results, resume_after): resume_after is the id to continue from
+    when max_batches stopped the run early, otherwise None.
+    """
+    reprocessor = REPROCESSORS[kind](business, batch_size=batch_size)
+    corrections = corrections or {}
+    if corrections and ids is None:
+        ids = list(corrections)
+
+    # Rows that still fail go back to 'error'; the id cursor keeps this run
+    # from claiming them again
+    batches = 0
+    while True:
+        if max_batches is not None and batches >= max_batches:
+            return reprocessor.results, after_id
+        claimed = claim_error_rows(kind, business, reprocessor.batch_size, ids, after_id)
+        if not claimed:
+            return reprocessor.results, None
+        process_claimed(reprocessor, claimed, corrections)
+        after_id = claimed[-1][0]
+        batches += 1
+
+
+def get_request_max_batches():
+    """Batches an API request may process before leaving the rest for later calls"""
+    return getattr(settings, 'REPROCESS_REQUEST_MAX_BATCHES', 5)
@@ -0,0 +1,173 @@
+"""
+Raw Record Retention
+Removes `cleaned` RawProductRecord/RawSalesRecord rows once they are older
+than the retention window, optionally archiving them first to gzipped NDJSON
+files (one directory per business and month, one file per batch). `error`
+rows are never touched so they stay queryable for reprocessing.
+A batch's files are written under a pending name and only published once the
+transaction deleting their rows commits, so a rolled-back batch leaves no
+archived copy behind to be duplicated by the next run.
+Run through `python manage.py prune_raw_records` or periodically by the
+import worker (RAW_RECORD_RETENTION_INTERVAL).
+"""
+import datetime
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RawProductRecord, RawSalesRecord
+
+logger = logging.getLogger(__name__)
+
+RETAINED_MODELS = {
+    'products': RawProductRecord,
+    'sales': RawSalesRecord,
+}
+
+ARCHIVE_FIELDS = ('id', 'business_id', 'raw_row', 'status', 'error_message', 'uploaded_at')
+
+
+def get_archive_root():
+    return Path(getattr(settings, 'RAW_RECORD_ARCHIVE_ROOT', settings.MEDIA_ROOT / 'archives'))
+
+
+def pending_dir(kind):
+    return get_archive_root() / kind / 'pending'
+
+
+def archive_name(business_id, month, first_id, last_id):
+    """e.g. 12_2025-01_1001-1500.ndjson.gz, the batch's name while pending"""
+    return f'{business_id}_{month:%Y-%m}_{first_id}-{last_id}.ndjson.gz'
+
+
+def archive_path(kind, name):
+    """Published location of a pending file, e.g. <root>/sales/12/2025-01/1001-1500.ndjson.gz"""
+    business_id, month, ids = name.split('_')
+    return get_archive_root() / kind / business_id / month / ids
+
+
+def archive_rows(kind, rows):
+    """
+    Write rows to pending per-business, per-month batch files and return
+    their names and the compressed bytes written
+    """
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[(row['business_id'], row['uploaded_at'].date().replace(day=1))].append(row)
+
+    names = []
+    written = 0
+    pending_dir(kind).mkdir(parents=True, exist_ok=True)
+    for (business_id, month), month_rows in grouped.items():
+        name = archive_name(business_id, month, month_rows[0]['id'], month_rows[-1]['id'])
+        payload = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in month_rows)
+        compressed = gzip.compress(payload.encode())
+        (pending_dir(kind) / name).write_bytes(compressed)
+        names.append(name)
+        written += len(compressed)
+    return names, written
+
+
+def publish_archives(kind, names):
+    """Move pending files to their archive paths once their rows are deleted"""
+    for name in names:
+        path = archive_path(kind, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(pending_dir(kind) / name, path)
+
+
+def discard_archives(kind, names):
+    for name in names:
+        (pending_dir(kind) / name).unlink(missing_ok=True)
+
+
+def recover_archives(kind):
+    """
+    Settle pending files left by a pruner that stopped before publishing or
+    discarding them: publish those whose rows are gone, discard those whose
+    rows are still there, and leave those a running pruner still has locked
+    """
+    model = RETAINED_MODELS[kind]
+    if not pending_dir(kind).is_dir():
+        return
+
+    for pending in pending_dir(kind).iterdir():
+        try:
+            with gzip.open(pending, 'rt') as archive:
+                ids = [json.loads(line)['id'] for line in archive]
+        except (OSError, EOFError, ValueError, KeyError):
+            logger.warning('Skipping unreadable pending archive %s', pending)
+            continue
+
+        rows = model.objects.filter(id__in=ids)
+        with transaction.atomic():
+            remaining = set(rows.values_list('id', flat=True))
+            unlocked = set(rows.select_for_update(skip_locked=True).values_list('id', flat=True))
+        if remaining != unlocked:
+            continue
+        if remaining:
+            discard_archives(kind, [pending.name])
+        else:
+            publish_archives(kind, [pending.name])
+
+
+def prune_batch(kind, cutoff, batch_size, archive):
+    """Archive and/or delete one batch; returns (rows, payload bytes, archive bytes)"""
+    model = RETAINED_MODELS[kind]
+    expired = model.objects.filter(status='cleaned', uploaded_at__lt=cutoff).order_by('id')
+
+    with transaction.atomic():
+        # Concurrent pruners on Postgres skip each other's batches
+        rows = list(expired.select_for_update(skip_locked=True).values(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            return 0, 0, 0
+
+        names, archived = archive_rows(kind, rows) if archive else ([], 0)
+        # A failed delete or commit discards the files; the rows stay for the next run
+        transaction.on_commit(partial(publish_archives, kind, names))
+        try:
+            model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        except Exception:
+            discard_archives(kind, names)
+            raise
+
+    reclaimed = sum(len(json.dumps(row, cls=DjangoJSONEncoder)) for row in rows)
+    return len(rows), reclaimed, archived
+
+
+def prune_raw_records(days=None, batch_size=None, archive=None, kinds=None, max_batches=None):
+    """
+    Remove expired cleaned raw rows in bounded batches and report, per kind,
+    how many rows were removed, the approximate row payload bytes reclaimed
+    and the compressed archive bytes written
+    """
+    days = getattr(settings, 'RAW_RECORD_RETENTION_DAYS', 90) if days is None else days
+    batch_size = batch_size or getattr(settings, 'RAW_RECORD_RETENTION_BATCH_SIZE', 5000)
+    if archive is None:
+        archive = getattr(settings, 'RAW_RECORD_ARCHIVE', True)
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+
+    summary = {}
+    for kind in kinds or RETAINED_MODELS:
+        totals = {'rows': 0, 'bytes_reclaimed': 0, 'archive_bytes': 0}
+        batches = 0
+        recover_archives(kind)
+        while max_batches is None or batches < max_batches:
+            rows, reclaimed, archived = prune_batch(kind, cutoff, batch_size, archive)
+            if not rows:
+                break
+            totals['rows'] += rows
+            totals['bytes_reclaimed'] += reclaimed
+            totals['archive_bytes'] += archived
+            batches += 1
+        summary[kind] = totals
+    return summary
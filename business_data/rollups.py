@@ -0,0 +1,177 @@
+"""
+Sales Rollups
+Keeps DailyProductSales in step with SalesRecord so analytics can read a
+few thousand pre-aggregated rows instead of the raw sales history
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+
+from .cache import bump_on_commit
+from .models import DailyProductSales, SalesRecord
+
+ROLLUP_FIELDS = ('business_id', 'product_id', 'date', 'channel')
+
+_date_field = SalesRecord._meta.get_field('date')
+
+# Deltas held back by deferred_deltas() in the current context, or None
+_deferred = ContextVar('rollup_deferred', default=None)
+
+
+def rollup_key(business_id, product_id, date, channel):
+    """Normalise a key so string dates from request data match stored dates"""
+    return (business_id, product_id, _date_field.to_python(date), channel)
+
+
+def sales_deltas(sales, sign=1):
+    """Sum (quantity, revenue, records) per rollup key for SalesRecord instances"""
+    deltas = defaultdict(lambda: [0, 0.0, 0])
+    for sale in sales:
+        delta = deltas[rollup_key(sale.business_id, sale.product_id, sale.date, sale.channel)]
+        delta[0] += sign * sale.quantity
+        delta[1] += sign * sale.revenue
+        delta[2] += sign
+    return deltas
+
+
+def merge_deltas(*groups):
+    merged = defaultdict(lambda: [0, 0.0, 0])
+    for deltas in groups:
+        for key, (quantity, revenue, records) in deltas.items():
+            delta = merged[key]
+            delta[0] += quantity
+            delta[1] += revenue
+            delta[2] += records
+    return merged
+
+
+@contextmanager
+def deferred_deltas():
+    """
+    Hold back the deltas applied inside the block and fold them into the
+    rollup in one step at the end, e.g. for the per-row signals of a bulk delete
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+
+    pending = []
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    apply_deltas(merge_deltas(*pending))
+
+
+def apply_deltas(deltas, attempts=3):
+    """Fold deltas into the rollup, retrying if a concurrent writer inserts a key first"""
+    pending = _deferred.get()
+    if pending is not None:
+        pending.append(deltas)
+        return
+
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                _apply_deltas(deltas)
+            return
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
+def _apply_deltas(deltas):
+    business_ids = {key[0] for key in deltas}
+    product_ids = {key[1] for key in deltas}
+    dates = {key[2] for key in deltas}
+
+    existing = DailyProductSales.objects.select_for_update().filter(
+        business_id__in=business_ids, product_id__in=product_ids, date__in=dates
+    )
+
+    to_update = []
+    emptied = []
+    seen = set()
+    for row in existing:
+        key = (row.business_id, row.product_id, row.date, row.channel)
+        if key not in deltas:
+            continue
+        seen.add(key)
+        quantity, revenue, records = deltas[key]
+        row.quantity += quantity
+        row.revenue += revenue
+        row.records += records
+        (emptied if row.records <= 0 else to_update).append(row)
+
+    # Removals for keys we never rolled up (e.g. mid-cascade deletes) are dropped
+    to_create = [
+        DailyProductSales(
+            **dict(zip(ROLLUP_FIELDS, key)),
+            quantity=quantity,
+            revenue=revenue,
+            records=records,
+        )
+        for key, (quantity, revenue, records) in deltas.items()
+        if key not in seen and records > 0
+    ]
+
+    if to_update:
+        DailyProductSales.objects.bulk_update(to_update, ['quantity', 'revenue', 'records'])
+    if emptied:
+        DailyProductSales.objects.filter(id__in=[row.id for row in emptied]).delete()
+    if to_create:
+        DailyProductSales.objects.bulk_create(to_create)
+
+
+def rebuild_rollup(business=None, batch_size=1000):
+    """
+    Recompute the rollup from SalesRecord, for one business or all of them,
+    and invalidate the cached analyses of every business it rewrites
+    """
+    sales = SalesRecord.objects.all()
+    rollup = DailyProductSales.objects.all()
+    if business is not None:
+        sales = sales.filter(business=business)
+        rollup = rollup.filter(business=business)
+
+    grouped = (
+        sales.values(*ROLLUP_FIELDS)
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'), total=Count('id'))
+        .order_by()
+    )
+
+    created = 0
+    with transaction.atomic():
+        if business is not None:
+            business_ids = {business.id}
+        else:
+            business_ids = set(rollup.values_list('business_id', flat=True).distinct())
+            business_ids.update(sales.values_list('business_id', flat=True).distinct())
+        for business_id in business_ids:
+            bump_on_commit(business_id)
+
+        rollup.delete()
+        batch = []
+        for row in grouped.iterator(chunk_size=batch_size):
+            batch.append(DailyProductSales(
+                **{field: row[field] for field in ROLLUP_FIELDS},
+                quantity=row['total_quantity'],
+                revenue=row['total_revenue'],
+                records=row['total'],
+            ))
+            if len(batch) == batch_size:
+                DailyProductSales.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        DailyProductSales.objects.bulk_create(batch)
+        created += len(batch)
+
+    return created
@@ -1,5 +1,7 @@
+from django.conf import settings
+from django.db.models import F
 from rest_framework import serializers
-from .models import Campaign, Product, SalesRecord
+from .models import Campaign, ImportJob, Product, SalesRecord
 
 
 class Productserializer(serializers.ModelSerializer):
@@ -8,6 +10,16 @@ class Productserializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'business', 'created_at')
 
+    def validate_name(self, value):
+        business = self.context.get('business')
+        if business is not None:
+            existing = Product.objects.filter(business=business, name=value)
+            if self.instance is not None:
+                existing = existing.exclude(pk=self.instance.pk)
+            if existing.exists():
+                raise serializers.ValidationError('A product with this name already exists')
+        return value
+
 
 class ProductCSVUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
@@ -18,12 +30,180 @@ class SalesRecordSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SalesRecord
-        fields = '__all__'
+        exclude = ('fingerprint',)
         read_only_fields = ('id', 'business', 'product', 'created_at', 'revenue')
 
 
+class ValuesListSerializer:
+    """
+    Read-only serializer for .values() rows on hot list endpoints.
+    Produces the same JSON as the matching ModelSerializer without building
+    model instances or per-field serializer objects.
+    """
+    fields = ()
+    expressions = {}
+    date_fields = ()
+    datetime_fields = ()
+
+    _datetime = serializers.DateTimeField()
+
+    def __init__(self, instance, many=True):
+        self.instance = instance
+
+    @classmethod
+    def values(cls, queryset):
+        """Select exactly the columns the serializer emits, joins included"""
+        plain = [name for name in cls.fields if name not in cls.expressions]
+        return queryset.values(*plain, **cls.expressions)
+
+    @classmethod
+    def to_representation(cls, row):
+        item = {name: row[name] for name in cls.fields}
+        for name in cls.date_fields:
+            if item[name] is not None:
+                item[name] = item[name].isoformat()
+        for name in cls.datetime_fields:
+            if item[name] is not None:
+                item[name] = cls._datetime.to_representation(item[name])
+        return item
+
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.instance]
+
+
+class ProductListSerializer(ValuesListSerializer):
+    fields = (
+        'id',
+        'name',
+        'sku',
+        'category',
+        'description',
+        'price',
+        'cost_price',
+        'attributes',
+        'created_at',
+        'business',
+    )
+    datetime_fields = ('created_at',)
+
+
+class SalesRecordListSerializer(ValuesListSerializer):
+    fields = (
+        'id',
+        'product_name',
+        'date',
+        'quantity',
+        'revenue',
+        'channel',
+        'created_at',
+        'business',
+        'product',
+    )
+    expressions = {'product_name': F('product__name')}
+    date_fields = ('date',)
+    datetime_fields = ('created_at',)
+
+
+class CampaignListSerializer(ValuesListSerializer):
+    fields = (
+        'id',
+        'goal',
+        'budget',
+        'status',
+        'payload',
+        'error_message',
+        'created_at',
+        'started_at',
+        'finished_at',
+    )
+    datetime_fields = ('created_at', 'started_at', 'finished_at')
+
+
+class RawErrorListSerializer(ValuesListSerializer):
+    fields = ('id', 'raw_row', 'error_message', 'uploaded_at')
+    datetime_fields = ('uploaded_at',)
+
+
+class ReprocessErrorsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    corrections = serializers.DictField(child=serializers.DictField(), required=False)
+    after = serializers.IntegerField(required=False, default=0)
+
+    def validate_corrections(self, value):
+        """Keys arrive as JSON strings; the engine expects raw record ids"""
+        try:
+            return {int(pk): row for pk, row in value.items()}
+        except ValueError:
+            raise serializers.ValidationError('Keys must be raw record ids')
+
+
+class ExportParamsSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=('csv', 'ndjson'), default='csv')
+    compress = serializers.ChoiceField(choices=('none', 'gzip'), default='none')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+
 class CampaignSerializer(serializers.ModelSerializer):
     class Meta:
         model = Campaign
-        fields = ('id', 'goal', 'budget', 'payload', 'created_at')
-        read_only_fields = ('id', 'payload', 'created_at')
\ No newline at end of file
+        fields = (
+            'id',
+            'goal',
+            'budget',
+            'status',
+            'payload',
+            'error_message',
+            'created_at',
+            'started_at',
+            'finished_at',
+        )
+        read_only_fields = (
+            'id',
+            'status',
+            'payload',
+            'error_message',
+            'created_at',
+            'started_at',
+            'finished_at',
+        )
+
+
+class CampaignBatchSerializer(serializers.Serializer):
+    business_slugs = serializers.ListField(
+        child=serializers.SlugField(max_length=255), allow_empty=False
+    )
+    goal = serializers.CharField(max_length=255)
+    budget = serializers.FloatField()
+
+    def validate_business_slugs(self, value):
+        value = list(dict.fromkeys(value))
+        limit = getattr(settings, 'CAMPAIGN_BATCH_MAX_BUSINESSES', 50)
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'At most {limit} businesses per request; '
+                'use the generate_campaign_batch command for more'
+            )
+        return value
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    throughput = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = (
+            'id',
+            'kind',
+            'status',
+            'rows_processed',
+            'rows_failed',
+            'throughput',
+            'summary',
+            'error_message',
+            'created_at',
+            'started_at',
+            'finished_at',
+        )
+        read_only_fields = fields
\ No newline at end of file
@@ -0,0 +1,90 @@
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import Business, BusinessMember
+from .access import invalidate_on_commit
+from .cache import bump_on_commit
+from . import jobs
+from .campaigns import get_executor, resume_campaigns, uses_thread_pool
+from .models import Product, SalesRecord
+from .rollups import apply_deltas, merge_deltas, sales_deltas
+
+
+@receiver(pre_save, sender=SalesRecord)
+def remember_previous_sale(sender, instance, **kwargs):
+    """Keep the stored version of an edited sale so its old rollup key can be reversed"""
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        previous = SalesRecord.objects.filter(pk=instance.pk).values(
+            'business_id', 'product_id', 'date', 'channel', 'quantity', 'revenue'
+        ).first()
+        if previous:
+            instance._rollup_previous = SalesRecord(**previous)
+
+
+@receiver(post_save, sender=SalesRecord)
+def roll_up_saved_sale(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    deltas = sales_deltas([instance])
+    if previous is not None:
+        deltas = merge_deltas(deltas, sales_deltas([previous], sign=-1))
+    apply_deltas(deltas)
+    bump_on_commit(instance.business_id)
+
+
+@receiver(post_delete, sender=SalesRecord)
+def roll_up_deleted_sale(sender, instance, origin=None, **kwargs):
+    # Deleting a product or business cascades to its rollup rows as well
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin is None or issubclass(origin_model, SalesRecord):
+        apply_deltas(sales_deltas([instance], sign=-1))
+    bump_on_commit(instance.business_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_analysis(sender, instance, **kwargs):
+    bump_on_commit(instance.business_id)
+
+
+@receiver(pre_save, sender=Business)
+def remember_previous_slug(sender, instance, **kwargs):
+    instance._access_previous_slug = None
+    if instance.pk is not None:
+        instance._access_previous_slug = (
+            Business.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def invalidate_business(sender, instance, **kwargs):
+    invalidate_on_commit(instance.slug)
+    previous_slug = getattr(instance, '_access_previous_slug', None)
+    if previous_slug and previous_slug != instance.slug:
+        invalidate_on_commit(previous_slug)
+
+
+@receiver(post_save, sender=BusinessMember)
+@receiver(post_delete, sender=BusinessMember)
+def invalidate_membership(sender, instance, **kwargs):
+    slug = Business.objects.filter(pk=instance.business_id).values_list('slug', flat=True).first()
+    if slug:
+        invalidate_on_commit(slug)
+
+
+@receiver(request_started)
+def resume_campaigns_once(sender, **kwargs):
+    """The first request served by a process picks up campaigns its predecessor left behind"""
+    request_started.disconnect(resume_campaigns_once)
+    if uses_thread_pool():
+        get_executor().submit(resume_campaigns)
+
+
+@receiver(request_started)
+def resume_import_jobs_once(sender, **kwargs):
+    """Likewise for import jobs queued or running in the previous process"""
+    request_started.disconnect(resume_import_jobs_once)
+    if jobs.uses_thread_pool():
+        jobs.get_executor().submit(jobs.resume_jobs)
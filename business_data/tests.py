@@ -1,3 +1,985 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.test import APIClient
+
+from users.models import Business, BusinessMember, User
+from .access import get_business_for_user
+from .aiservice import CampaignGenerator
+from .analytics import (
+    ProductStats,
+    compute_sales_analyses,
+    product_analyses,
+    product_analysis,
+    sales_analyses,
+    sales_analysis,
+)
+from .campaigns import (
+    claim_campaign,
+    claim_next_campaign,
+    enqueue_campaign,
+    reclaim_stale_campaigns,
+    run_campaign,
+)
+from .cleaning import clean_product_frame, clean_sales_frame
+from .importers import ProductImporter, SalesImporter
+from .jobs import claim_job, reclaim_stale_jobs, run_import_job
+from .llm import CachedProvider, FakeProvider, LLMError, OpenAIProvider
+from .models import Campaign, DailyProductSales, ImportJob, Product, RawSalesRecord, SalesRecord
+from .reprocessing import reprocess_errors
+from .retention import archive_rows, prune_raw_records
+from .rollups import rebuild_rollup
+from .serializers import (
+    Productserializer,
+    ProductListSerializer,
+    SalesRecordListSerializer,
+    SalesRecordSerializer,
+)
+
+def make_business(email='owner@example.com', name='Test Shop'):
+    user = User.objects.create_user(
+        email=email, password='pw12345678', first_name='Test', last_name='Owner', phone='0700000000'
+    )
+    business = Business.objects.create(owner=user, name=name, industry='retail')
+    BusinessMember.objects.create(business=business, user=user, role='owner')
+    return user, business
+
+
+class FailingProvider(FakeProvider):
+    def complete(self, prompt, timeout=None):
+        raise RuntimeError('provider down')
+
+
+@override_settings(CAMPAIGN_JOBS_MODE='worker', CAMPAIGN_MAX_PER_BUSINESS=2)
+class CampaignQueueTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+
+    def test_campaign_moves_from_pending_to_done(self):
+        campaign = enqueue_campaign(self.business, goal='Grow', budget=1000, user=self.user)
+        self.assertEqual(campaign.status, 'pending')
+
+        self.assertTrue(claim_campaign(campaign.id, self.business.id))
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'running')
+        self.assertEqual(campaign.attempts, 1)
+        self.assertIsNotNone(campaign.started_at)
+
+        run_campaign(campaign, provider=FakeProvider(latency=0))
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'done')
+        self.assertIn('Campaign Goal: Grow', campaign.payload['summary'])
+        self.assertIsNotNone(campaign.finished_at)
+
+    def test_provider_error_fails_campaign(self):
+        campaign = enqueue_campaign(self.business, goal='Grow', budget=1000)
+        claim_campaign(campaign.id, self.business.id)
+        campaign.refresh_from_db()
+
+        with override_settings(CAMPAIGN_SECTION_MODE='sequential'):
+            run_campaign(campaign, provider=FailingProvider())
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'failed')
+        self.assertEqual(campaign.error_message, 'provider down')
+
+    def test_business_limit_holds_back_extra_campaigns(self):
+        campaigns = [enqueue_campaign(self.business, goal=f'g{i}', budget=1) for i in range(3)]
+        _, other = make_business('other@example.com', 'Other Shop')
+        other_campaign = enqueue_campaign(other, goal='g', budget=1)
+
+        claimed = [claim_campaign(campaign.id, self.business.id) for campaign in campaigns]
+        self.assertEqual(claimed, [True, True, False])
+        self.assertTrue(claim_campaign(other_campaign.id, other.id))
+
+        self.assertIsNone(claim_next_campaign())
+        Campaign.objects.filter(id=campaigns[0].id).update(status='done')
+        self.assertEqual(claim_next_campaign().id, campaigns[2].id)
+
+    def test_expired_lease_frees_slot_and_requeues(self):
+        campaigns = [enqueue_campaign(self.business, goal=f'g{i}', budget=1) for i in range(3)]
+        for campaign in campaigns[:2]:
+            claim_campaign(campaign.id, self.business.id)
+        Campaign.objects.filter(id=campaigns[0].id).update(
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+
+        # The abandoned run no longer counts towards the limit
+        self.assertTrue(claim_campaign(campaigns[2].id, self.business.id))
+
+        self.assertEqual(reclaim_stale_campaigns(), (1, 0))
+        campaigns[0].refresh_from_db()
+        self.assertEqual(campaigns[0].status, 'pending')
+        self.assertIsNone(campaigns[0].started_at)
+
+    def test_polling_and_enqueueing_reclaim_stale_runs(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        stale = enqueue_campaign(self.business, goal='g', budget=1)
+        claim_campaign(stale.id, self.business.id)
+        Campaign.objects.filter(id=stale.id).update(started_at=timezone.now() - timedelta(hours=1))
+
+        response = client.get(f'/business/{self.business.slug}/campaigns/{stale.id}/')
+        self.assertEqual(response.data['status'], 'pending')
+
+        claim_campaign(stale.id, self.business.id)
+        Campaign.objects.filter(id=stale.id).update(started_at=timezone.now() - timedelta(hours=1))
+        enqueue_campaign(self.business, goal='g', budget=1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'pending')
+
+    @override_settings(CAMPAIGN_MAX_ATTEMPTS=1)
+    def test_expired_lease_fails_after_max_attempts(self):
+        campaign = enqueue_campaign(self.business, goal='g', budget=1)
+        claim_campaign(campaign.id, self.business.id)
+        Campaign.objects.filter(id=campaign.id).update(started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(reclaim_stale_campaigns(), (0, 1))
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'failed')
+
+    def test_reclaimed_run_cannot_overwrite_result(self):
+        campaign = enqueue_campaign(self.business, goal='g', budget=1)
+        claim_campaign(campaign.id, self.business.id)
+        stale_run = Campaign.objects.select_related('business').get(id=campaign.id)
+        Campaign.objects.filter(id=campaign.id).update(started_at=timezone.now() - timedelta(hours=1))
+        reclaim_stale_campaigns()
+
+        run_campaign(stale_run, provider=FakeProvider(latency=0))
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'pending')
+        self.assertEqual(campaign.payload, {})
+
+    def test_create_endpoint_queues_campaign(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post(
+            f'/business/{self.business.slug}/campaigns/', {'goal': 'Grow', 'budget': 500}, format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+
+        response = client.get(f'/business/{self.business.slug}/campaigns/{response.data["id"]}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'pending')
+
+    def test_batch_endpoint_queues_campaigns(self):
+        _, other = make_business('other@example.com', 'Other Shop')
+        BusinessMember.objects.create(business=other, user=self.user, role='staff')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post(
+            '/business/campaigns/batch/',
+            {'business_slugs': [self.business.slug, other.slug], 'goal': 'Grow', 'budget': 500},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(
+            [(item['business'], item['status']) for item in response.data],
+            [(self.business.slug, 'pending'), (other.slug, 'pending')],
+        )
+
+        # Queued campaigns go through the same claim and business limit
+        claimed = claim_next_campaign()
+        self.assertIn(claimed.id, [item['id'] for item in response.data])
+        self.assertEqual(claimed.status, 'running')
+
+        # The grouped analysis pass left both summaries in the cache for the runs
+        with self.assertNumQueries(0):
+            product_analysis(self.business)
+            sales_analysis(other)
+
+
+class BatchAnalysisTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.shop = make_business()
+        _, self.kiosk = make_business('kiosk@example.com', 'Kiosk')
+        _, self.empty = make_business('empty@example.com', 'Empty')
+        for business, prices in ((self.shop, (5, 30, 12, 30)), (self.kiosk, (8,))):
+            for i, price in enumerate(prices):
+                product = Product.objects.create(
+                    business=business, name=f'Item {i}', price=price,
+                    category='shoes' if i % 2 else 'hats',
+                )
+                SalesRecord.objects.create(
+                    business=business, product=product, date=f'2026-01-0{i + 1}',
+                    quantity=i + 1, revenue=price * (i + 1),
+                )
+        self.businesses = [self.shop, self.kiosk, self.empty]
+
+    def test_grouped_queries_match_single_business_analysis(self):
+        ids = [business.id for business in self.businesses]
+        stats = ProductStats.for_businesses(ids, top_n=3)
+        sales = compute_sales_analyses(ids, top_n=3)
+        for business in self.businesses:
+            self.assertEqual(stats[business.id], ProductStats.for_business(business, top_n=3))
+            self.assertEqual(
+                sales[business.id], compute_sales_analyses([business.id], top_n=3)[business.id]
+            )
+
+    def test_cached_batch_matches_cached_single(self):
+        products = product_analyses(self.businesses)
+        sales = sales_analyses(self.businesses)
+        cache.clear()
+        for business in self.businesses:
+            self.assertEqual(products[business.id], product_analysis(business))
+            self.assertEqual(sales[business.id], sales_analysis(business))
+
+    def test_product_stats_endpoint_is_cached_until_the_catalog_changes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/business/{self.shop.slug}/products/stats/'
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_products'], 4)
+        self.assertEqual(response.data['categories'], ['hats', 'shoes'])
+        self.assertEqual(response.data['price_range'], {'min': 5, 'max': 30})
+        self.assertEqual(
+            [product['name'] for product in response.data['top_products']],
+            ['Item 1', 'Item 3', 'Item 2', 'Item 0'],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(url).data, response.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(business=self.shop, name='Coat', price=90)
+        response = client.get(url)
+        self.assertEqual(response.data['total_products'], 5)
+        self.assertEqual(response.data['top_products'][0]['name'], 'Coat')
+
+    def test_cache_stats_command(self):
+        product_analysis(self.shop)
+        product_analyses(self.businesses)
+
+        out = io.StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('analysis: 1 hits, 3 misses, hit rate 0.25', out.getvalue())
+
+    def test_generate_campaign_batch_command(self):
+        out = io.StringIO()
+        call_command('generate_campaign_batch', '--all', '--chunk-size', '2', stdout=out)
+
+        self.assertIn('3 campaigns generated, 0 failed', out.getvalue())
+        self.assertEqual(
+            sorted(Campaign.objects.values_list('business__slug', 'status')),
+            sorted((business.slug, 'done') for business in self.businesses),
+        )
+
+
+class CleaningTests(SimpleTestCase):
+    def test_fractional_quantity_is_rejected(self):
+        cleaned = clean_sales_frame(pd.DataFrame({
+            'product_name': ['Shoes', 'Hats', 'Socks'],
+            'quantity': ['1.5', '2.0', '3'],
+            'date': ['2026-01-01'] * 3,
+        }))
+        self.assertEqual(
+            cleaned['error_message'].tolist(), ['Quantity must be a number', None, None]
+        )
+        self.assertEqual(cleaned['quantity'].tolist(), [0, 2, 3])
+
+    def test_sales_rules(self):
+        cleaned = clean_sales_frame(pd.DataFrame({
+            'product_name': ['Shoes', '', 'Hats', 'Socks', 'Belts'],
+            'quantity': ['2', '1', '0', 'many', '1'],
+            'date': ['2026-01-01', '2026-01-01', '2026-01-01', '2026-01-01', 'someday'],
+            'channel': ['online', None, None, None, None],
+        }))
+        self.assertEqual(cleaned['error_message'].tolist(), [
+            None,
+            'Missing required fields',
+            'Missing required fields',
+            'Quantity must be a number',
+            'Invalid date',
+        ])
+        self.assertEqual(cleaned.loc[0, 'date'], date(2026, 1, 1))
+        self.assertEqual(cleaned['channel'].tolist()[:2], ['online', 'offline'])
+
+    def test_product_rules(self):
+        cleaned = clean_product_frame(pd.DataFrame({
+            'name': ['Shoes', None, 'Hats'],
+            'price': ['20', '5', 'cheap'],
+            'colour': ['red', 'blue', None],
+        }))
+        self.assertEqual(
+            cleaned['error_message'].tolist(),
+            [None, 'Missing required product name', 'Price must be a number'],
+        )
+        self.assertEqual(cleaned.loc[0, 'price'], 20.0)
+        self.assertEqual(cleaned.loc[0, 'cost_price'], 0.0)
+        self.assertEqual(cleaned.loc[0, 'attributes'], {'colour': 'red'})
+
+
+class ProductImporterTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+
+    def import_products(self, text, batch_size=None):
+        importer = ProductImporter(self.business, batch_size=batch_size)
+        return importer.import_csv(io.StringIO(text))
+
+    def test_reimport_updates_in_place(self):
+        results = self.import_products('name,price,category\nShoes,20,Footwear\nHats,10,\n')
+        self.assertEqual(results, {'created': 2, 'updated': 0, 'errors': 0})
+
+        results = self.import_products('name,price,category\nShoes,25,Footwear\nSocks,5,\n,1,\n')
+        self.assertEqual(results, {'created': 1, 'updated': 1, 'errors': 1})
+        self.assertEqual(
+            dict(Product.objects.filter(business=self.business).values_list('name', 'price')),
+            {'Shoes': 25.0, 'Hats': 10.0, 'Socks': 5.0},
+        )
+
+    def test_later_row_wins_within_a_file(self):
+        results = self.import_products('name,price\nShoes,20\nShoes,30\n')
+        self.assertEqual(results, {'created': 1, 'updated': 1, 'errors': 0})
+        self.assertEqual(Product.objects.get(business=self.business, name='Shoes').price, 30.0)
+
+
+@override_settings(IMPORT_JOBS_MODE='worker', IMPORT_BATCH_SIZE=2)
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        media_root = override_settings(MEDIA_ROOT=Path(tempfile.mkdtemp()))
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, text):
+        return self.client.post(
+            f'/business/{self.business.slug}/sales/upload/',
+            {'file': SimpleUploadedFile('sales.csv', text.encode(), content_type='text/csv')},
+            format='multipart',
+        )
+
+    def test_upload_is_imported_in_chunks_by_the_worker(self):
+        response = self.upload(SALES_CSV)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['job']['id']
+
+        call_command('process_import_jobs', '--once')
+
+        response = self.client.get(f'/business/{self.business.slug}/imports/{job_id}/')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['summary'], {'cleaned': 3, 'duplicates': 0, 'errors': 1})
+        self.assertEqual(response.data['rows_failed'], 1)
+        self.assertEqual(
+            sum(DailyProductSales.objects.filter(business=self.business).values_list('quantity', flat=True)),
+            5,
+        )
+
+    def test_identical_file_is_not_queued_again(self):
+        first = self.upload(SALES_CSV)
+        second = self.upload(SALES_CSV)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['job']['id'], first.data['job']['id'])
+
+    def abandon(self, job_id):
+        """Claim the job as a worker that then dies"""
+        claim_job(job_id)
+        ImportJob.objects.filter(id=job_id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+    def test_abandoned_job_is_requeued_and_finished(self):
+        job_id = self.upload(SALES_CSV).data['job']['id']
+        self.abandon(job_id)
+
+        call_command('process_import_jobs', '--once')
+
+        job = ImportJob.objects.get(id=job_id)
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+        self.assertEqual(job.summary, {'cleaned': 3, 'duplicates': 0, 'errors': 1})
+
+    @override_settings(IMPORT_JOB_MAX_ATTEMPTS=1)
+    def test_abandoned_job_fails_after_max_attempts_and_allows_reupload(self):
+        first = self.upload(SALES_CSV).data['job']['id']
+        self.abandon(first)
+
+        # The dead job no longer passes for an identical import
+        response = self.upload(SALES_CSV)
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data['job']['id'], first)
+
+        self.assertEqual(reclaim_stale_jobs(), (0, 1))
+        self.assertEqual(ImportJob.objects.get(id=first).status, 'failed')
+
+    def test_reclaimed_run_cannot_overwrite_result(self):
+        job_id = self.upload(SALES_CSV).data['job']['id']
+        claim_job(job_id)
+        stale_run = ImportJob.objects.select_related('business').get(id=job_id)
+        ImportJob.objects.filter(id=job_id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        reclaim_stale_jobs()
+
+        run_import_job(stale_run)
+        job = ImportJob.objects.get(id=job_id)
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.summary, {})
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        shoes = Product.objects.create(business=self.business, name='Shoes', price=20)
+        self.sales = [
+            SalesRecord.objects.create(
+                business=self.business, product=shoes, date=date(2026, 1, 1 + i % 3),
+                quantity=i + 1, revenue=20.0 * (i + 1),
+            )
+            for i in range(7)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_keyset_pages_cover_every_row_once(self):
+        seen = []
+        url = f'/business/{self.business.slug}/sales/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        expected = [sale.id for sale in sorted(self.sales, key=lambda s: (s.date, s.id), reverse=True)]
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(f'/business/{self.business.slug}/sales/?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        shoes = Product.objects.create(business=self.business, name='Shoes', price=20)
+        self.sales = [
+            SalesRecord.objects.create(
+                business=self.business, product=shoes, date=date(2026, 1, 1 + i % 3),
+                quantity=i + 1, revenue=20.0 * (i + 1),
+            )
+            for i in range(7)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, query):
+        response = self.client.get(f'/business/{self.business.slug}/sales/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_in_date_order(self):
+        lines = self.export('type=csv').decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'product_name', 'date'])
+        ids = [int(line.split(',')[0]) for line in lines[1:]]
+        self.assertEqual(ids, [sale.id for sale in sorted(self.sales, key=lambda s: (s.date, s.id))])
+
+    def test_gzipped_ndjson_export_with_date_filter(self):
+        body = gzip.decompress(self.export('type=ndjson&compress=gzip&start=2026-01-03'))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [sale.id for sale in self.sales if sale.date == date(2026, 1, 3)],
+        )
+        self.assertEqual(rows[0]['product_name'], 'Shoes')
+
+
+class SlowProvider(FakeProvider):
+    """Fake LLM that notes each call's timeout and whether the call has returned"""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.timeouts = []
+        self.returned = threading.Event()
+
+    def complete(self, prompt, timeout=None):
+        self.timeouts.append(timeout)
+        try:
+            return super().complete(prompt, timeout=timeout)
+        finally:
+            self.returned.set()
+
+
+@override_settings(CAMPAIGN_SECTION_MODE='parallel', CAMPAIGN_SECTION_TIMEOUTS={'summary': 0.2})
+class SectionTimeoutTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+
+    def test_slow_summary_falls_back_and_frees_its_thread(self):
+        provider = SlowProvider(latency=5)
+        started = time.monotonic()
+        payload = CampaignGenerator(self.business, provider=provider).generate_campaign('Grow', 100)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(payload['incomplete_sections'], ['summary'])
+        self.assertIn('Campaign Goal: Grow', payload['summary'])
+        self.assertLessEqual(provider.timeouts[0], 0.2)
+        # The provider call itself gave up rather than holding a pool thread for 5s
+        self.assertTrue(provider.returned.wait(1))
+
+
+def read_events(chunks):
+    """Parse server-sent events into (event, data) pairs"""
+    for chunk in chunks:
+        for message in chunk.decode().split('\n\n'):
+            if message:
+                event, data = message.split('\n')
+                yield event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+
+@override_settings(CAMPAIGN_JOBS_MODE='worker')
+class CampaignStreamViewTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stream(self):
+        return self.client.post(
+            f'/business/{self.business.slug}/campaigns/stream/',
+            {'goal': 'Grow', 'budget': 500},
+            format='json',
+        )
+
+    def test_sections_stream_in_order_then_payload_is_saved(self):
+        response = self.stream()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = list(read_events(response.streaming_content))
+        campaign = Campaign.objects.get()
+
+        self.assertEqual(events[0], ('campaign', {'id': campaign.id, 'status': 'running'}))
+        self.assertEqual(events[-1], ('done', {'id': campaign.id, 'status': 'done'}))
+        self.assertEqual({event for event, _ in events[1:-1]}, {'section', 'token'})
+
+        sections = {data['name']: data['value'] for event, data in events if event == 'section'}
+        tokens = ''.join(data['text'] for event, data in events if event == 'token')
+        self.assertEqual(tokens, sections['summary'])
+        # Tokens come before the summary section they make up
+        names = [data.get('name') for event, data in events]
+        last_token = max(i for i, (event, _) in enumerate(events) if event == 'token')
+        self.assertLess(last_token, names.index('summary'))
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'done')
+        self.assertEqual(campaign.payload, sections)
+
+    def test_client_disconnect_fails_campaign(self):
+        response = self.stream()
+        chunks = iter(response.streaming_content)
+        event, data = next(read_events([next(chunks)]))
+        self.assertEqual(event, 'campaign')
+        next(chunks)
+        response.close()
+
+        campaign = Campaign.objects.get(id=data['id'])
+        self.assertEqual(campaign.status, 'failed')
+        self.assertEqual(campaign.error_message, 'Stream closed before completion')
+        self.assertEqual(campaign.payload, {})
+
+    @override_settings(CAMPAIGN_MAX_PER_BUSINESS=1)
+    def test_business_at_limit_queues_instead_of_streaming(self):
+        claim_campaign(enqueue_campaign(self.business, goal='g', budget=1).id, self.business.id)
+
+        response = self.stream()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+
+
+SALES_CSV = (
+    'product_name,date,quantity,revenue,channel\n'
+    'Shoes,2026-01-01,2,40,online\n'
+    'Shoes,2026-01-01,2,40,online\n'
+    'Hats,2026-01-02,1,15,offline\n'
+    'Socks,not a date,1,5,offline\n'
+)
+
+
+def import_sales(business, text, importer_class=SalesImporter, batch_size=None):
+    return importer_class(business, batch_size=batch_size).import_csv(io.StringIO(text))
+
+
+class RacingSalesImporter(SalesImporter):
+    """Misses rows stored by an overlapping upload until it writes its chunk"""
+
+    def import_frame(self, df):
+        self.racing = True
+        return super().import_frame(df)
+
+    def find_imported(self, fingerprints):
+        if self.racing:
+            self.racing = False
+            return set()
+        return super().find_imported(fingerprints)
+
+
+class BusinessAccessCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.business = make_business()
+        self.staff = User.objects.create_user(
+            email='staff@example.com', password='pw12345678', first_name='Staff', last_name='User',
+            phone='0700000001',
+        )
+        self.member = BusinessMember.objects.create(business=self.business, user=self.staff)
+
+    def test_repeat_lookup_is_one_cache_read(self):
+        get_business_for_user(self.staff, self.business.slug)
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                mock.patch('business_data.access.get_version') as get_version:
+            with self.assertNumQueries(0):
+                business = get_business_for_user(self.staff, self.business.slug)
+        self.assertEqual(business.id, self.business.id)
+        self.assertEqual(get_many.call_count, 1)
+        get_version.assert_not_called()
+
+        out = io.StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('business access: 1 hits, 1 misses, hit rate 0.5', out.getvalue())
+
+    def test_membership_change_invalidates_entry_on_commit(self):
+        get_business_for_user(self.staff, self.business.slug)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.delete()
+            # Until the delete commits, other requests still see the membership
+            get_business_for_user(self.staff, self.business.slug)
+        with self.assertRaises(PermissionDenied):
+            get_business_for_user(self.staff, self.business.slug)
+
+
+class ListSerializerParityTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        self.product = Product.objects.create(
+            business=self.business, name='Shoes', sku='SH-1', category='Footwear',
+            description='Leather', price=20, cost_price=12, attributes={'colour': 'red'},
+        )
+        self.sale = SalesRecord.objects.create(
+            business=self.business, product=self.product, date=date(2026, 1, 1),
+            quantity=2, revenue=40, channel='online',
+        )
+
+    def test_product_list_matches_model_serializer(self):
+        rows = ProductListSerializer.values(Product.objects.filter(id=self.product.id))
+        self.assertEqual(
+            ProductListSerializer(rows).data, [Productserializer(self.product).data]
+        )
+
+    def test_sales_list_matches_model_serializer(self):
+        rows = SalesRecordListSerializer.values(SalesRecord.objects.filter(id=self.sale.id))
+        self.assertEqual(
+            SalesRecordListSerializer(rows).data, [SalesRecordSerializer(self.sale).data]
+        )
+
+
+class SalesDeduplicationTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+
+    def test_identical_rows_in_one_chunk_are_kept(self):
+        results = import_sales(self.business, SALES_CSV)
+        self.assertEqual(results, {'cleaned': 3, 'duplicates': 0, 'errors': 1})
+        self.assertEqual(SalesRecord.objects.filter(business=self.business).count(), 3)
+
+    def test_reupload_skips_sales_and_error_rows(self):
+        import_sales(self.business, SALES_CSV)
+        results = import_sales(self.business, SALES_CSV)
+
+        self.assertEqual(results, {'cleaned': 0, 'duplicates': 3, 'errors': 1})
+        self.assertEqual(SalesRecord.objects.filter(business=self.business).count(), 3)
+        self.assertEqual(RawSalesRecord.objects.filter(business=self.business).count(), 4)
+
+    def test_partial_reupload_only_adds_new_rows(self):
+        import_sales(self.business, SALES_CSV)
+        results = import_sales(
+            self.business,
+            'product_name,date,quantity,revenue,channel\n'
+            'Hats,2026-01-02,1,15,offline\n'
+            'Socks,not a date,1,5,offline\n'
+            'Belts,2026-01-03,1,20,online\n',
+        )
+
+        self.assertEqual(results, {'cleaned': 1, 'duplicates': 1, 'errors': 1})
+        self.assertEqual(RawSalesRecord.objects.filter(business=self.business, status='error').count(), 1)
+
+    def test_identical_rows_across_chunks_are_kept(self):
+        csv = 'product_name,date,quantity,revenue,channel\n' + 'Coke,2026-01-01,1,50,offline\n' * 10
+        results = import_sales(self.business, csv, batch_size=4)
+        self.assertEqual(results, {'cleaned': 10, 'duplicates': 0, 'errors': 0})
+
+        # The same file fingerprints identically whatever the chunk size
+        results = import_sales(self.business, csv, batch_size=10)
+        self.assertEqual(results, {'cleaned': 0, 'duplicates': 10, 'errors': 0})
+
+    def test_rows_stored_by_overlapping_upload_count_as_duplicates(self):
+        import_sales(self.business, SALES_CSV)
+        results = import_sales(self.business, SALES_CSV, importer_class=RacingSalesImporter)
+
+        self.assertEqual(results, {'cleaned': 0, 'duplicates': 3, 'errors': 1})
+        self.assertEqual(SalesRecord.objects.filter(business=self.business).count(), 3)
+        self.assertEqual(RawSalesRecord.objects.filter(business=self.business).count(), 4)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        self.shoes = Product.objects.create(business=self.business, name='Shoes', price=20)
+        self.hats = Product.objects.create(business=self.business, name='Hats', price=10)
+        for day in (1, 2):
+            for product in (self.shoes, self.hats):
+                for _ in range(3):
+                    SalesRecord.objects.create(
+                        business=self.business, product=product, date=f'2026-01-0{day}',
+                        quantity=2, revenue=product.price * 2,
+                    )
+
+    def rollup(self):
+        return sorted(DailyProductSales.objects.values_list(
+            'product__name', 'date', 'quantity', 'revenue', 'records'
+        ))
+
+    def assert_matches_rebuild(self):
+        maintained = self.rollup()
+        rebuild_rollup(self.business)
+        self.assertEqual(maintained, self.rollup())
+
+    def test_saves_and_edits_keep_rollup_in_step(self):
+        sale = SalesRecord.objects.filter(product=self.shoes).first()
+        sale.date = date(2026, 1, 5)
+        sale.quantity = 7
+        sale.save()
+
+        self.assertIn(('Shoes', date(2026, 1, 5), 7, 40.0, 1), self.rollup())
+        self.assert_matches_rebuild()
+
+    def test_bulk_delete_updates_rollup_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            SalesRecord.objects.filter(date='2026-01-01').delete()
+
+        rollup_queries = [q for q in queries if 'dailyproductsales' in q['sql']]
+        self.assertLessEqual(len(rollup_queries), 3)
+        self.assertEqual({row[1] for row in self.rollup()}, {date(2026, 1, 2)})
+        self.assert_matches_rebuild()
+
+    def test_product_delete_cascades_to_rollup(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.shoes.delete()
+
+        # Only the cascade itself touches the rollup
+        self.assertLessEqual(len([q for q in queries if 'dailyproductsales' in q['sql']]), 2)
+        self.assertEqual({name for name, *_ in self.rollup()}, {'Hats'})
+        self.assert_matches_rebuild()
+
+    def test_rebuild_invalidates_cached_sales_analysis(self):
+        for quantity, business in ((10, self.business), (20, None)):
+            cached = sales_analysis(self.business)
+            # A write that skips the signals leaves the rollup and the cache behind
+            SalesRecord.objects.filter(product=self.hats).update(quantity=quantity)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                rebuild_rollup(business)
+            self.assertNotEqual(sales_analysis(self.business), cached)
+
+
+class ReprocessingClaimTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        self.rows = [
+            RawSalesRecord.objects.create(
+                business=self.business,
+                raw_row={'product_name': f'Item {i}', 'date': '2026-01-01', 'quantity': '1'},
+                status='error',
+                error_message='Invalid date',
+            )
+            for i in range(3)
+        ]
+
+    def test_stale_claim_is_taken_over(self):
+        RawSalesRecord.objects.filter(id=self.rows[0].id).update(
+            status='cleaning', claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        RawSalesRecord.objects.filter(id=self.rows[1].id).update(
+            status='cleaning', claimed_at=timezone.now()
+        )
+
+        results, resume_after = reprocess_errors('sales', self.business)
+
+        self.assertIsNone(resume_after)
+        self.assertEqual(results['cleaned'], 2)
+        statuses = dict(RawSalesRecord.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[row.id] for row in self.rows], ['cleaned', 'cleaning', 'cleaned']
+        )
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user, self.business = make_business()
+        self.root = Path(tempfile.mkdtemp())
+        archive_root = override_settings(RAW_RECORD_ARCHIVE_ROOT=self.root)
+        archive_root.enable()
+        self.addCleanup(archive_root.disable)
+
+        for i in range(3):
+            RawSalesRecord.objects.create(
+                business=self.business, raw_row={'product_name': f'Item {i}'}, status='cleaned'
+            )
+        RawSalesRecord.objects.update(uploaded_at=timezone.now() - timedelta(days=200))
+
+    def archived_ids(self):
+        return sorted(
+            json.loads(line)['id']
+            for path in (self.root / 'sales').glob('*/*/*.ndjson.gz')
+            for line in gzip.open(path, 'rt')
+        )
+
+    def prune(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return prune_raw_records(kinds=['sales'], batch_size=2)
+
+    def test_rolled_back_batch_is_not_archived_twice(self):
+        ids = sorted(RawSalesRecord.objects.values_list('id', flat=True))
+        with mock.patch.object(QuerySet, 'delete', side_effect=DatabaseError('lost connection')):
+            with self.assertRaises(DatabaseError):
+                self.prune()
+        self.assertEqual(self.archived_ids(), [])
+        self.assertEqual(list((self.root / 'sales' / 'pending').iterdir()), [])
+
+        self.assertEqual(self.prune()['sales']['rows'], 3)
+        self.assertEqual(self.archived_ids(), ids)
+        self.assertFalse(RawSalesRecord.objects.exists())
+
+    def test_next_run_settles_files_left_pending(self):
+        rows = list(RawSalesRecord.objects.order_by('id').values(
+            'id', 'business_id', 'raw_row', 'status', 'error_message', 'uploaded_at'
+        ))
+        # A pruner that stopped after its delete committed, and one whose delete never did
+        archive_rows('sales', rows[:1])
+        RawSalesRecord.objects.filter(id=rows[0]['id']).delete()
+        archive_rows('sales', rows[1:2])
+
+        self.prune()
+        self.assertEqual(self.archived_ids(), [row['id'] for row in rows])
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-style endpoint that plays back the server's scripted responses"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            server.client_ports.add(self.client_address[1])
+            status, delay = server.script.pop(0) if server.script else (200, 0)
+
+        prompt = request['messages'][0]['content']
+        if status == 200:
+            body = json.dumps({'choices': [{'message': {'content': f'copy for {prompt}'}}]}).encode()
+        else:
+            body = b'{"error": "busy"}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        if status in (429, 503):
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+        if delay:
+            # Trickle the body out so each receive succeeds but the whole read is slow
+            try:
+                for byte in body:
+                    time.sleep(delay / len(body))
+                    self.wfile.write(bytes([byte]))
+                    self.wfile.flush()
+            except BrokenPipeError:
+                # The client gave up, which is what the timeout test expects
+                pass
+        else:
+            self.wfile.write(body)
+
+
+class HTTPProviderTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+        self.server.lock = threading.Lock()
+        self.server.calls = 0
+        self.server.client_ports = set()
+        self.server.script = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def provider(self, **kwargs):
+        kwargs.setdefault('timeout', 5)
+        kwargs.setdefault('max_retries', 2)
+        provider = OpenAIProvider(
+            base_url=f'http://127.0.0.1:{self.server.server_port}', api_key='key', model='m', **kwargs
+        )
+        self.addCleanup(provider.pool.close)
+        return provider
+
+    def test_retries_throttling_and_unavailable_then_succeeds(self):
+        self.server.script = [(429, 0), (503, 0)]
+        self.assertEqual(self.provider().complete('shoes'), 'copy for shoes')
+        self.assertEqual(self.server.calls, 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.script = [(503, 0)] * 3
+        with self.assertRaisesRegex(LLMError, 'HTTP 503'):
+            self.provider().complete('shoes')
+        self.assertEqual(self.server.calls, 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.script = [(400, 0)]
+        with self.assertRaisesRegex(LLMError, 'HTTP 400'):
+            self.provider().complete('shoes')
+        self.assertEqual(self.server.calls, 1)
+
+    def test_connections_are_reused(self):
+        provider = self.provider()
+        for i in range(5):
+            provider.complete(f'prompt {i}')
+        self.assertEqual(self.server.calls, 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_timeout_bounds_slow_body(self):
+        self.server.script = [(200, 3)]
+        started = time.monotonic()
+        with self.assertRaisesRegex(LLMError, 'timed out'):
+            self.provider(timeout=0.5).complete('shoes')
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_call_timeout_shortens_the_deadline(self):
+        self.server.script = [(200, 3)]
+        started = time.monotonic()
+        with self.assertRaisesRegex(LLMError, 'timed out'):
+            self.provider(timeout=5).complete('shoes', timeout=0.5)
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_identical_prompts_are_cached(self):
+        provider = CachedProvider(self.provider(), maxsize=10, ttl=60)
+        self.assertEqual(provider.complete('shoes'), provider.complete('shoes'))
+        provider.complete('hats')
+        self.assertEqual(self.server.calls, 2)
+        self.assertEqual((provider.cache.hits, provider.cache.misses), (1, 2))
@@ -2,19 +2,39 @@ from django.urls import path
 from .views import (
     ProductListCreateView,
     ProductDetailView,
+    ProductStatsView,
     ProductCSVUploadView,
+    ProductExportView,
     SalesListCreateView,
     SalesDetailView,
     SalesCSVUploadView,
+    SalesExportView,
+    ImportJobDetailView,
+    RawErrorListView,
+    ReprocessErrorsView,
     CampaignListCreateView,
+    CampaignBatchView,
+    CampaignDetailView,
+    CampaignStreamView,
+    CampaignExportView,
 )
 
 urlpatterns = [
+    path('campaigns/batch/', CampaignBatchView.as_view()),
     path('<slug:business_slug>/products/', ProductListCreateView.as_view()),
+    path('<slug:business_slug>/products/stats/', ProductStatsView.as_view()),
     path('<slug:business_slug>/products/<int:pk>/', ProductDetailView.as_view()),
     path('<slug:business_slug>/products/upload/', ProductCSVUploadView.as_view()),
+    path('<slug:business_slug>/products/export/', ProductExportView.as_view()),
     path('<slug:business_slug>/sales/', SalesListCreateView.as_view()),
     path('<slug:business_slug>/sales/<int:pk>/', SalesDetailView.as_view()),
     path('<slug:business_slug>/sales/upload/', SalesCSVUploadView.as_view()),
+    path('<slug:business_slug>/sales/export/', SalesExportView.as_view()),
+    path('<slug:business_slug>/imports/<int:pk>/', ImportJobDetailView.as_view()),
+    path('<slug:business_slug>/raw/<str:kind>/errors/', RawErrorListView.as_view()),
+    path('<slug:business_slug>/raw/<str:kind>/reprocess/', ReprocessErrorsView.as_view()),
     path('<slug:business_slug>/campaigns/', CampaignListCreateView.as_view()),
+    path('<slug:business_slug>/campaigns/stream/', CampaignStreamView.as_view()),
+    path('<slug:business_slug>/campaigns/<int:pk>/', CampaignDetailView.as_view()),
+    path('<slug:business_slug>/campaigns/export/', CampaignExportView.as_view()),
 ]
\ No newline at end of file
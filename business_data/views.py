@@ -6,17 +6,35 @@ try:
 except ImportError:
     pd = None
 
+from django.http import Http404, StreamingHttpResponse
 from rest_framework import permissions, status
-from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
-from users.models import Business
-from .aiservice import CampaignGenerator
-from .models import Product, RawProductRecord, SalesRecord, RawSalesRecord
+from .access import get_business_for_user, get_businesses_for_user
+from .analytics import product_analysis
+from .campaigns import (
+    campaign_event_stream,
+    enqueue_batch,
+    enqueue_campaign,
+    reclaim_business_campaigns,
+    start_streamed_campaign,
+)
+from .exports import CONTENT_TYPES, export_filename, stream_export
+from .jobs import enqueue_import
+from .models import Campaign, ImportJob, Product, SalesRecord
+from .pagination import KeysetPagination
+from .reprocessing import REPROCESSORS, error_rows, get_request_max_batches, reprocess_errors
 from .serializers import (
+    CampaignBatchSerializer,
     CampaignSerializer,
+    ExportParamsSerializer,
+    ImportJobSerializer,
     ProductCSVUploadSerializer,
+    ProductListSerializer,
     Productserializer,
+    RawErrorListSerializer,
+    ReprocessErrorsSerializer,
+    SalesRecordListSerializer,
     SalesRecordSerializer,
 )
 
@@ -27,15 +45,7 @@ class BusinessScopedAPIView(APIView):
 
     def get_business(self, request, business_slug):
         """Get business and check permissions"""
-        business = get_object_or_404(Business, slug=business_slug)
-        has_membership = business.owner_id == request.user.id or business.members.filter(
-            user=request.user
-        ).exists()
-
-        if not has_membership:
-            raise PermissionDenied('You do not have access to this business.')
-
-        return business
+        return get_business_for_user(request.user, business_slug)
 
 
 class ProductListCreateView(BusinessScopedAPIView):
@@ -43,13 +53,16 @@ class ProductListCreateView(BusinessScopedAPIView):
 
     def get(self, request, business_slug):
         business = self.get_business(request, business_slug)
-        products = Product.objects.filter(business=business)
-        serializer = Productserializer(products, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination(ordering=('id',))
+        products = paginator.paginate_queryset(
+            ProductListSerializer.values(Product.objects.filter(business=business)), request
+        )
+        serializer = ProductListSerializer(products, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, business_slug):
         business = self.get_business(request, business_slug)
-        serializer = Productserializer(data=request.data)
+        serializer = Productserializer(data=request.data, context={'business': business})
         if serializer.is_valid():
             serializer.save(business=business)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -57,13 +70,23 @@ class ProductListCreateView(BusinessScopedAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ProductStatsView(BusinessScopedAPIView):
+    """Catalog summary for dashboards"""
+
+    def get(self, request, business_slug):
+        business = self.get_business(request, business_slug)
+        return Response(product_analysis(business))
+
+
 class ProductDetailView(BusinessScopedAPIView):
     """Retrieve, update and delete individual products"""
 
     def put(self, request, business_slug, pk):
         business = self.get_business(request, business_slug)
         product = get_object_or_404(Product, business=business, id=pk)
-        serializer = Productserializer(product, data=request.data, partial=True)
+        serializer = Productserializer(
+            product, data=request.data, partial=True, context={'business': business}
+        )
 
         if serializer.is_valid():
             serializer.save(business=business)
@@ -80,7 +103,6 @@ class ProductDetailView(BusinessScopedAPIView):
 
 class ProductCSVUploadView(BusinessScopedAPIView):
     """Upload product CSV files"""
-    REQUIRED_FIELD = 'name'
 
     def post(self, request, business_slug):
         business = self.get_business(request, business_slug)
@@ -96,61 +118,11 @@ class ProductCSVUploadView(BusinessScopedAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        try:
-            df = pd.read_csv(file)
-        except Exception as exc:
-            return Response(
-                {'error': f'Unable to read CSV file: {exc}'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        results = {'created': 0, 'updated': 0, 'errors': 0}
-
-        for _, row in df.iterrows():
-            raw_data = row.to_dict()
-            name = raw_data.get(self.REQUIRED_FIELD)
-
-            raw_record = RawProductRecord.objects.create(
-                business=business,
-                raw_row=raw_data,
-                status='raw',
-            )
-
-            if not name or str(name).strip() == '':
-                raw_record.status = 'error'
-                raw_record.error_message = 'Missing required product name'
-                raw_record.save()
-                results['errors'] += 1
-                continue
-
-            price = float(raw_data.get('price', 0) or 0)
-            cost_price = float(raw_data.get('cost_price', 0) or 0)
-            category = raw_data.get('category', '') or ''
-
-            reserved = {'name', 'price', 'cost_price', 'category'}
-            attributes = {k: v for k, v in raw_data.items() if k not in reserved}
-
-            product, created = Product.objects.update_or_create(
-                business=business,
-                name=name,
-                defaults={
-                    'price': price,
-                    'cost_price': cost_price,
-                    'category': category,
-                    'attributes': attributes,
-                },
-            )
-
-            raw_record.status = 'cleaned'
-            raw_record.save()
-
-            if created:
-                results['created'] += 1
-            else:
-                results['updated'] += 1
+        job, _ = enqueue_import(business, 'products', file, user=request.user)
 
         return Response(
-            {'message': 'Product import completed successfully', 'summary': results}
+            {'message': 'Product import queued', 'job': ImportJobSerializer(job).data},
+            status=status.HTTP_202_ACCEPTED,
         )
 
 
@@ -159,9 +131,13 @@ class SalesListCreateView(BusinessScopedAPIView):
 
     def get(self, request, business_slug):
         business = self.get_business(request, business_slug)
-        sales = SalesRecord.objects.filter(business=business).order_by('-date')
-        serializer = SalesRecordSerializer(sales, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination(ordering=('-date', '-id'))
+        sales = paginator.paginate_queryset(
+            SalesRecordListSerializer.values(SalesRecord.objects.filter(business=business)),
+            request,
+        )
+        serializer = SalesRecordListSerializer(sales, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, business_slug):
         business = self.get_business(request, business_slug)
@@ -203,7 +179,9 @@ class SalesDetailView(BusinessScopedAPIView):
 
     def put(self, request, business_slug, pk):
         business = self.get_business(request, business_slug)
-        sale = get_object_or_404(SalesRecord, business=business, id=pk)
+        sale = get_object_or_404(
+            SalesRecord.objects.select_related('product'), business=business, id=pk
+        )
 
         quantity = request.data.get('quantity', sale.quantity)
         try:
@@ -252,64 +230,112 @@ class SalesCSVUploadView(BusinessScopedAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        try:
-            df = pd.read_csv(file)
-        except Exception as exc:
+        job, created = enqueue_import(business, 'sales', file, user=request.user)
+
+        if not created:
             return Response(
-                {'error': f'Unable to read CSV file: {exc}'},
-                status=status.HTTP_400_BAD_REQUEST,
+                {'message': 'Identical file already imported', 'job': ImportJobSerializer(job).data},
+                status=status.HTTP_200_OK,
             )
 
-        results = {'cleaned': 0, 'errors': 0}
+        return Response(
+            {'message': 'Sales data import queued', 'job': ImportJobSerializer(job).data},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
-        for _, row in df.iterrows():
-            raw_data = row.to_dict()
-            product_name = raw_data.get('product_name')
-            quantity = raw_data.get('quantity')
-            date = raw_data.get('date')
-            revenue = raw_data.get('revenue')
 
-            raw_record = RawSalesRecord.objects.create(
-                business=business,
-                raw_row=raw_data,
-            )
+class ImportJobDetailView(BusinessScopedAPIView):
+    """Report progress of a CSV import job"""
 
-            if not product_name or not date or not quantity:
-                raw_record.status = 'error'
-                raw_record.error_message = 'Missing required fields'
-                raw_record.save()
-                results['errors'] += 1
-                continue
-
-            try:
-                quantity = int(quantity)
-            except (TypeError, ValueError):
-                raw_record.status = 'error'
-                raw_record.error_message = 'Quantity must be a number'
-                raw_record.save()
-                results['errors'] += 1
-                continue
-
-            product, _ = Product.objects.get_or_create(
-                business=business, name=product_name
-            )
-            calculated_revenue = product.price * quantity
-            revenue_value = float(revenue) if revenue else calculated_revenue
-
-            SalesRecord.objects.create(
-                business=business,
-                product=product,
-                quantity=quantity,
-                date=date,
-                revenue=revenue_value,
-                channel=raw_data.get('channel', 'offline'),
+    def get(self, request, business_slug, pk):
+        business = self.get_business(request, business_slug)
+        job = get_object_or_404(ImportJob, business=business, id=pk)
+        return Response(ImportJobSerializer(job).data)
+
+
+class RawErrorListView(BusinessScopedAPIView):
+    """List uploaded rows that failed cleaning"""
+
+    def get(self, request, business_slug, kind):
+        business = self.get_business(request, business_slug)
+        if kind not in REPROCESSORS:
+            raise Http404
+        paginator = KeysetPagination(ordering=('id',))
+        rows = paginator.paginate_queryset(
+            RawErrorListSerializer.values(error_rows(kind, business)), request
+        )
+        return paginator.get_paginated_response(RawErrorListSerializer(rows, many=True).data)
+
+
+class ReprocessErrorsView(BusinessScopedAPIView):
+    """Re-run cleaning over failed rows, optionally with corrected values"""
+
+    def post(self, request, business_slug, kind):
+        business = self.get_business(request, business_slug)
+        if kind not in REPROCESSORS:
+            raise Http404
+
+        serializer = ReprocessErrorsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if pd is None:
+            return Response(
+                {'error': 'Reprocessing requires pandas. Install pandas to continue.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-            raw_record.status = 'cleaned'
-            raw_record.save()
-            results['cleaned'] += 1
+        results, resume_after = reprocess_errors(
+            kind,
+            business,
+            corrections=serializer.validated_data.get('corrections'),
+            ids=serializer.validated_data.get('ids'),
+            max_batches=get_request_max_batches(),
+            after_id=serializer.validated_data['after'],
+        )
+        return Response({
+            'results': results,
+            'remaining': error_rows(kind, business).count(),
+            'after': resume_after,
+        })
+
+
+class ExportView(BusinessScopedAPIView):
+    """Stream every row of one kind as CSV or NDJSON, optionally gzipped"""
+    kind = None
+
+    def get(self, request, business_slug):
+        business = self.get_business(request, business_slug)
+        params = ExportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        export_type = params.validated_data['type']
+        compress = params.validated_data['compress']
+        response = StreamingHttpResponse(
+            stream_export(
+                self.kind,
+                business,
+                export_type=export_type,
+                compress=compress,
+                start=params.validated_data.get('start'),
+                end=params.validated_data.get('end'),
+            ),
+            content_type='application/gzip' if compress == 'gzip' else CONTENT_TYPES[export_type],
+        )
+        filename = export_filename(business, self.kind, export_type, compress)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ProductExportView(ExportView):
+    kind = 'products'
 
-        return Response({'message': 'Sales data import completed', 'results': results})
+
+class SalesExportView(ExportView):
+    kind = 'sales'
+
+
+class CampaignExportView(ExportView):
+    kind = 'campaigns'
 
 
 class CampaignListCreateView(BusinessScopedAPIView):
@@ -326,19 +352,88 @@ class CampaignListCreateView(BusinessScopedAPIView):
         serializer = CampaignSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        goal = serializer.validated_data['goal']
-        budget = serializer.validated_data['budget']
+        campaign = enqueue_campaign(
+            business,
+            goal=serializer.validated_data['goal'],
+            budget=serializer.validated_data['budget'],
+            user=request.user,
+        )
+
+        return Response(
+            CampaignSerializer(campaign).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class CampaignStreamView(BusinessScopedAPIView):
+    """Generate a campaign in the request and stream its sections as server-sent events"""
+
+    def post(self, request, business_slug):
+        business = self.get_business(request, business_slug)
+        serializer = CampaignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        campaign, claimed = start_streamed_campaign(
+            business,
+            goal=serializer.validated_data['goal'],
+            budget=serializer.validated_data['budget'],
+            user=request.user,
+        )
+        if not claimed:
+            # Business is at its concurrency limit; the campaign waits in the queue
+            return Response(
+                CampaignSerializer(campaign).data, status=status.HTTP_202_ACCEPTED
+            )
+
+        response = StreamingHttpResponse(
+            campaign_event_stream(campaign), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 
-        generator = CampaignGenerator(business)
-        plan = generator.generate_campaign(goal=goal, budget=budget)
+class CampaignBatchView(APIView):
+    """Queue one campaign for each of several businesses the user can access"""
+    permission_classes = [permissions.IsAuthenticated]
 
-        campaign = business.campaigns.create(
-            goal=goal,
-            budget=budget,
-            payload=plan,
-            created_by=request.user,
+    def post(self, request):
+        serializer = CampaignBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        businesses, missing = get_businesses_for_user(
+            request.user, serializer.validated_data['business_slugs']
+        )
+        if missing:
+            return Response(
+                {'business_slugs': [f"Unknown or inaccessible businesses: {', '.join(missing)}"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        campaigns = enqueue_batch(
+            businesses,
+            goal=serializer.validated_data['goal'],
+            budget=serializer.validated_data['budget'],
+            user=request.user,
         )
 
         return Response(
-            CampaignSerializer(campaign).data, status=status.HTTP_201_CREATED
-        )
\ No newline at end of file
+            [
+                {
+                    'business': campaign.business.slug,
+                    **CampaignSerializer(campaign).data,
+                }
+                for campaign in campaigns
+            ],
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class CampaignDetailView(BusinessScopedAPIView):
+    """Poll a campaign's generation status and result"""
+
+    def get(self, request, business_slug, pk):
+        business = self.get_business(request, business_slug)
+        reclaim_business_campaigns(business.id)
+        campaign = get_object_or_404(Campaign, business=business, id=pk)
+        return Response(CampaignSerializer(campaign).data)
@@ -119,6 +119,24 @@ else:
         }
     }
 
+# Cache: Redis from docker-compose when configured, in-process memory otherwise
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL and importlib.util.find_spec('redis'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'promogpt',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -145,13 +163,17 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded files (queued CSV imports)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -175,8 +197,119 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_USER_CLASS': 'users.authentication.ClaimsUser',
+    'TOKEN_REFRESH_SERIALIZER': 'users.authentication.RevocationAwareTokenRefreshSerializer',
 }
 
+# Per-process cache of users decoded from access tokens. Revocations are stored
+# on the user row (tokens_valid_after) and reach other processes once their
+# cached entry expires, i.e. within JWT_USER_CACHE_TTL seconds.
+JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', '10000'))
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '60'))
+
 # Email Configuration (for development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-DEFAULT_FROM_EMAIL = 'PromoGPT <no-reply@promogpt.com>'
\ No newline at end of file
+DEFAULT_FROM_EMAIL = 'PromoGPT <no-reply@promogpt.com>'
+
+# CSV import tuning
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+
+# 'copy' loads sales uploads with COPY FROM STDIN on Postgres; other
+# databases always use the ORM ('orm') importers
+IMPORT_BACKEND = os.getenv('IMPORT_BACKEND', 'orm')
+IMPORT_COPY_BATCH_SIZE = int(os.getenv('IMPORT_COPY_BATCH_SIZE', '10000'))
+
+# Error-row batches (IMPORT_BATCH_SIZE rows each) one reprocess API call may
+# run; larger backlogs continue from the returned 'after' id or the command
+REPROCESS_REQUEST_MAX_BATCHES = int(os.getenv('REPROCESS_REQUEST_MAX_BATCHES', '5'))
+
+# Rows a reprocessing worker claimed more than this long ago without finishing
+# (the worker crashed or was killed) are claimed again by the next run
+REPROCESS_CLAIM_SECONDS = int(os.getenv('REPROCESS_CLAIM_SECONDS', '600'))
+
+# Cleaned raw upload rows older than this are archived to gzipped NDJSON under
+# RAW_RECORD_ARCHIVE_ROOT and deleted; 'error' rows are always kept. The import
+# worker prunes every RAW_RECORD_RETENTION_INTERVAL seconds (0 disables it).
+RAW_RECORD_RETENTION_DAYS = int(os.getenv('RAW_RECORD_RETENTION_DAYS', '90'))
+RAW_RECORD_RETENTION_BATCH_SIZE = int(os.getenv('RAW_RECORD_RETENTION_BATCH_SIZE', '5000'))
+RAW_RECORD_RETENTION_INTERVAL = int(os.getenv('RAW_RECORD_RETENTION_INTERVAL', '3600'))
+RAW_RECORD_ARCHIVE = os.getenv('RAW_RECORD_ARCHIVE', 'true').lower() == 'true'
+RAW_RECORD_ARCHIVE_ROOT = Path(os.getenv('RAW_RECORD_ARCHIVE_ROOT', MEDIA_ROOT / 'archives'))
+
+# 'thread' runs import jobs on an in-process pool; 'worker' leaves them
+# for `python manage.py process_import_jobs`
+IMPORT_JOBS_MODE = os.getenv('IMPORT_JOBS_MODE', 'thread')
+IMPORT_JOB_WORKERS = int(os.getenv('IMPORT_JOB_WORKERS', '2'))
+
+# A running import renews heartbeat_at after every chunk. One that has not for
+# IMPORT_JOB_LEASE_SECONDS was abandoned (crash, restart) and is queued again,
+# or failed once it has been claimed IMPORT_JOB_MAX_ATTEMPTS times. Pending and
+# abandoned jobs no longer block re-uploading the same file after that long.
+IMPORT_JOB_LEASE_SECONDS = int(os.getenv('IMPORT_JOB_LEASE_SECONDS', '300'))
+IMPORT_JOB_MAX_ATTEMPTS = int(os.getenv('IMPORT_JOB_MAX_ATTEMPTS', '3'))
+
+# Campaign generation: 'thread' runs it on an in-process pool of
+# CAMPAIGN_WORKERS threads, 'worker' leaves it for `manage.py process_campaigns`.
+# At most CAMPAIGN_MAX_PER_BUSINESS campaigns generate at once per business.
+CAMPAIGN_JOBS_MODE = os.getenv('CAMPAIGN_JOBS_MODE', 'thread')
+CAMPAIGN_WORKERS = int(os.getenv('CAMPAIGN_WORKERS', '4'))
+CAMPAIGN_MAX_PER_BUSINESS = int(os.getenv('CAMPAIGN_MAX_PER_BUSINESS', '2'))
+
+# A running campaign whose started_at is older than CAMPAIGN_LEASE_SECONDS is
+# taken as abandoned: it no longer counts towards the limit and is queued again,
+# or failed once it has been claimed CAMPAIGN_MAX_ATTEMPTS times. Keep the
+# lease well above the slowest generation (LLM_TIMEOUT plus section timeouts).
+CAMPAIGN_LEASE_SECONDS = int(os.getenv('CAMPAIGN_LEASE_SECONDS', '600'))
+CAMPAIGN_MAX_ATTEMPTS = int(os.getenv('CAMPAIGN_MAX_ATTEMPTS', '3'))
+
+# Within one campaign, 'parallel' builds the sections that only need the
+# analyses at once on CAMPAIGN_SECTION_WORKERS shared threads; 'sequential'
+# builds them one by one. A parallel section that errors or takes longer than
+# its timeout (CAMPAIGN_SECTION_TIMEOUTS, e.g. {'summary': 60}, else
+# CAMPAIGN_SECTION_TIMEOUT seconds) falls back to an empty value, or to the
+# brief for the summary, and is listed in the payload's incomplete_sections.
+CAMPAIGN_SECTION_MODE = os.getenv('CAMPAIGN_SECTION_MODE', 'parallel')
+CAMPAIGN_SECTION_WORKERS = int(os.getenv('CAMPAIGN_SECTION_WORKERS', '16'))
+CAMPAIGN_SECTION_TIMEOUT = float(os.getenv('CAMPAIGN_SECTION_TIMEOUT', '30'))
+CAMPAIGN_SECTION_TIMEOUTS = {}
+
+# Batch generation (`manage.py generate_campaign_batch`) analyses
+# CAMPAIGN_BATCH_SIZE businesses per grouped pass and generates them on
+# CAMPAIGN_BATCH_WORKERS threads. The batch endpoint only queues campaigns
+# and accepts at most CAMPAIGN_BATCH_MAX_BUSINESSES slugs per request.
+CAMPAIGN_BATCH_SIZE = int(os.getenv('CAMPAIGN_BATCH_SIZE', '100'))
+CAMPAIGN_BATCH_WORKERS = int(os.getenv('CAMPAIGN_BATCH_WORKERS', '8'))
+CAMPAIGN_BATCH_MAX_BUSINESSES = int(os.getenv('CAMPAIGN_BATCH_MAX_BUSINESSES', '50'))
+
+# LLM used to write campaign copy: 'fake' echoes the brief locally, 'openai'
+# (any OpenAI-compatible endpoint) and 'anthropic' call LLM_API_URL over a
+# pooled keep-alive connection. LLM_TIMEOUT bounds a whole call, from waiting
+# for one of LLM_MAX_CONCURRENCY slots through retries to the last byte (for
+# streams: until the response starts, then the longest pause); identical prompts are served from an LRU of LLM_CACHE_SIZE entries
+# for LLM_CACHE_TTL seconds (0 disables it).
+CAMPAIGN_LLM_PROVIDER = os.getenv('CAMPAIGN_LLM_PROVIDER', 'fake')
+FAKE_LLM_LATENCY = float(os.getenv('FAKE_LLM_LATENCY', '0'))
+LLM_API_URL = os.getenv('LLM_API_URL')
+LLM_API_KEY = os.getenv('LLM_API_KEY', '')
+LLM_MODEL = os.getenv('LLM_MODEL', '')
+LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', '1024'))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '4'))
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '256'))
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '3600'))
+
+# Seconds a product/sales analysis stays cached; writes invalidate it sooner
+ANALYSIS_CACHE_TIMEOUT = int(os.getenv('ANALYSIS_CACHE_TIMEOUT', '3600'))
+
+# Seconds a (user, business) access decision is reused; membership changes
+# invalidate it immediately
+BUSINESS_ACCESS_CACHE_TIMEOUT = int(os.getenv('BUSINESS_ACCESS_CACHE_TIMEOUT', '60'))
+
+# Keyset pagination for list endpoints (?page_size= is capped at the max)
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '100'))
+LIST_MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', '1000'))
+
+# Rows fetched per database round trip by the streaming export endpoints
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
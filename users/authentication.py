@@ -0,0 +1,156 @@
+"""
+Stateless JWT authentication
+Requests are authenticated from the access token's claims without building a
+users.User instance. Tokens issued before the user's tokens_valid_after (set
+on password reset or deactivation) are rejected; that column is read once per
+token and the decoded user is then kept in a small per-process LRU cache, so
+a revocation reaches every process within JWT_USER_CACHE_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from token claims instead of a users.User row"""
+
+    @property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+
+def tokens_for_user(user):
+    """
+    Issue a refresh token (and through it an access token). Only claims that
+    cannot go stale before a revocation are added; memberships and roles are
+    always read from the database.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh['is_active'] = user.is_active
+    refresh['is_staff'] = user.is_staff
+    return refresh
+
+
+def revoke_user_tokens(user_id):
+    """Reject every token issued to the user before now; returns the new cut-off"""
+    valid_after = int(time.time())
+    User.objects.filter(pk=user_id).update(tokens_valid_after=valid_after)
+    user_cache.discard_user(user_id)
+    return valid_after
+
+
+def is_revoked(token):
+    """
+    True when the user is gone, inactive or has revoked tokens since this one
+    was issued. iat has one-second resolution, so a token issued in the same
+    second as the revocation is still accepted.
+    """
+    row = (
+        User.objects.filter(pk=token[api_settings.USER_ID_CLAIM])
+        .values_list('is_active', 'tokens_valid_after')
+        .first()
+    )
+    if row is None:
+        return True
+    is_active, valid_after = row
+    if not is_active:
+        return True
+    return valid_after is not None and token.get('iat', 0) < valid_after
+
+
+class TokenUserCache:
+    """Thread-safe LRU of raw token -> ClaimsUser with a TTL"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[raw_token]
+                return None
+            self._entries.move_to_end(raw_token)
+            return user
+
+    def set(self, raw_token, user):
+        # Never outlive the token itself
+        expires_at = min(time.time() + self.ttl, user.token.get('exp', 0))
+        with self._lock:
+            self._entries[raw_token] = (user, expires_at)
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for raw_token in [
+                key for key, (user, _) in self._entries.items() if user.id == user_id
+            ]:
+                del self._entries[raw_token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = TokenUserCache(
+    maxsize=getattr(settings, 'JWT_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 60),
+)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """JWT authentication that never loads users.User from the database"""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        user = user_cache.get(raw_token)
+        if user is None:
+            user = self.get_user(self.get_validated_token(raw_token))
+            user_cache.set(raw_token, user)
+
+        return user, user.token
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        if is_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+        return user
+
+
+class RevocationAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuse to refresh tokens issued before a password reset or deactivation"""
+
+    def validate(self, attrs):
+        if is_revoked(RefreshToken(attrs['refresh'])):
+            raise InvalidToken('Token has been revoked')
+        return super().validate(attrs)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='tokens_valid_after',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -41,6 +41,8 @@ class User(AbstractBaseUser,PermissionsMixin):
     is_verified=models.BooleanField(default=False)
     is_active=models.BooleanField(default=True)
     is_staff=models.BooleanField(default=False)
+    # Unix time; tokens issued earlier are rejected (password reset, deactivation)
+    tokens_valid_after=models.PositiveIntegerField(null=True,blank=True)
 
 
     USERNAME_FIELD='email'
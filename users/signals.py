@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import revoke_user_tokens
+from .models import User
+
+
+@receiver(pre_save, sender=User)
+def remember_credentials(sender, instance, **kwargs):
+    instance._previous_credentials = None
+    if instance.pk is not None:
+        instance._previous_credentials = (
+            User.objects.filter(pk=instance.pk).values_list('password', 'is_active').first()
+        )
+
+
+@receiver(post_save, sender=User)
+def revoke_on_credential_change(sender, instance, created, **kwargs):
+    """Password resets and deactivation invalidate outstanding tokens"""
+    previous = getattr(instance, '_previous_credentials', None)
+    if created or previous is None:
+        return
+
+    password, was_active = previous
+    if password != instance.password or (was_active and not instance.is_active):
+        # Keep the instance in step so a later save() doesn't clear the cut-off
+        instance.tokens_valid_after = revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_on_delete(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
@@ -1,3 +1,81 @@
+import time
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .authentication import is_revoked, revoke_user_tokens, tokens_for_user, user_cache
+from .models import User
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(
+            email='owner@example.com', password='pw12345678', first_name='Test', last_name='Owner', phone='0700000000'
+        )
+        self.client = APIClient()
+
+    def issued_before_now(self):
+        """Tokens for the user with an iat safely before any revocation made by the test"""
+        refresh = tokens_for_user(self.user)
+        refresh['iat'] = int(time.time()) - 10
+        access = refresh.access_token
+        access['iat'] = refresh['iat']
+        return refresh, access
+
+    def get_businesses(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/users/business/')
+
+    def test_valid_token_authenticates(self):
+        _, access = self.issued_before_now()
+        self.assertEqual(self.get_businesses(access).status_code, 200)
+
+    def test_tokens_carry_no_membership_claims(self):
+        refresh = tokens_for_user(self.user)
+        self.assertNotIn('businesses', refresh.payload)
+        self.assertNotIn('role', refresh.access_token.payload)
+
+    def test_password_change_revokes_cached_token(self):
+        refresh, access = self.issued_before_now()
+        self.assertEqual(self.get_businesses(access).status_code, 200)
+
+        self.user.set_password('new-password-123')
+        self.user.save()
+
+        self.assertEqual(self.get_businesses(access).status_code, 401)
+        response = self.client.post('/users/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocation_is_stored_on_the_user(self):
+        _, access = self.issued_before_now()
+        valid_after = revoke_user_tokens(self.user.pk)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.tokens_valid_after, valid_after)
+        self.assertIsInstance(valid_after, int)
+        self.assertTrue(is_revoked(access))
+
+    def test_token_from_revocation_second_is_accepted(self):
+        valid_after = revoke_user_tokens(self.user.pk)
+        access = tokens_for_user(self.user).access_token
+        access['iat'] = valid_after
+        self.assertFalse(is_revoked(access))
+
+    def test_later_save_keeps_revocation(self):
+        self.user.set_password('new-password-123')
+        self.user.save()
+        self.user.first_name = 'Renamed'
+        self.user.save()
+
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.tokens_valid_after)
+
+    def test_deactivation_and_deletion_revoke(self):
+        _, access = self.issued_before_now()
+        self.user.is_active = False
+        self.user.save()
+        self.assertTrue(is_revoked(access))
 
-# Create your tests here.
+        self.user.delete()
+        self.assertTrue(is_revoked(access))
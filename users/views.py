@@ -10,6 +10,7 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 
+from .authentication import tokens_for_user
 from .models import User, Business, BusinessMember
 from .serializers import RegisterSerializer, UserSerializer, BusinessSerializer
 
@@ -21,7 +22,7 @@ class RegisterView(APIView):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
             return Response({
                 'user': UserSerializer(user).data,
                 "refresh": str(refresh),
@@ -42,7 +43,7 @@ class LoginView(APIView):
         if not user:
             return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         return Response({
             'user': UserSerializer(user).data,
             'refresh': str(refresh),
@@ -66,15 +67,15 @@ class BusinessCreateView(APIView):
     def post(self, request):
         serializer = BusinessSerializer(data=request.data)
         if serializer.is_valid():
-            business = serializer.save(owner=request.user)
-            BusinessMember.objects.create(business=business, user=request.user, role="owner")
+            business = serializer.save(owner_id=request.user.id)
+            BusinessMember.objects.create(business=business, user_id=request.user.id, role="owner")
             return Response(BusinessSerializer(business).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class BusinessListView(APIView):
     def get(self, request):
-        businesses = Business.objects.filter(owner=request.user)
+        businesses = Business.objects.filter(owner_id=request.user.id)
         return Response(BusinessSerializer(businesses, many=True).data)
 
 